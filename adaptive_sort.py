@@ -0,0 +1,120 @@
+"""
+Адаптивная устойчивая сортировка списка словарей по ключу.
+
+Рассчитана на почти упорядоченные данные, например файл бюджета, к которому
+добавили или в котором изменили одну запись. Список разбивается на уже
+упорядоченные серии; если серия одна, сортировка заканчивается одной линейной
+проверкой. Соседние серии сливаются, причём бинарный поиск отсекает их части,
+которые уже стоят на своих местах, так что смещённая запись просто
+переставляется на нужную позицию.
+"""
+
+MIN_RUN = 32
+
+
+def _bisect_right(array, key, value, low, high):
+    """Первая позиция в array[low:high], значение ключа на которой больше value."""
+    while low < high:
+        middle = (low + high) // 2
+        if value < array[middle][key]:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def _bisect_left(array, key, value, low, high):
+    """Первая позиция в array[low:high], значение ключа на которой не меньше value."""
+    while low < high:
+        middle = (low + high) // 2
+        if array[middle][key] < value:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _binary_insertion_sort(array, key, start, end, sorted_end):
+    """Досортировывает array[start:end], если array[start:sorted_end] уже упорядочен."""
+    for index in range(sorted_end, end):
+        item = array[index]
+        position = _bisect_right(array, key, item[key], start, index)
+        array[position + 1:index + 1] = array[position:index]
+        array[position] = item
+
+
+def _count_run(array, key, start, length):
+    """
+    Возвращает конец упорядоченной серии, начинающейся в start.
+    Строго убывающая серия разворачивается на месте (устойчивость сохраняется).
+    """
+    end = start + 1
+    if end == length:
+        return end
+    if array[end][key] < array[start][key]:
+        while end < length and array[end][key] < array[end - 1][key]:
+            end += 1
+        array[start:end] = array[start:end][::-1]
+    else:
+        while end < length and not array[end][key] < array[end - 1][key]:
+            end += 1
+    return end
+
+
+def _merge(array, key, start, middle, end):
+    """Сливает упорядоченные array[start:middle] и array[middle:end]."""
+    # Начало левой серии, не превосходящее первый элемент правой, уже на месте
+    start = _bisect_right(array, key, array[middle][key], start, middle)
+    if start == middle:
+        return
+    # Конец правой серии, не меньший последнего элемента левой, тоже на месте
+    end = _bisect_left(array, key, array[middle - 1][key], middle, end)
+
+    left = array[start:middle]
+    left_index = 0
+    right_index = middle
+    output_index = start
+    while left_index < len(left) and right_index < end:
+        if array[right_index][key] < left[left_index][key]:
+            array[output_index] = array[right_index]
+            right_index += 1
+        else:
+            array[output_index] = left[left_index]
+            left_index += 1
+        output_index += 1
+    array[output_index:output_index + len(left) - left_index] = left[left_index:]
+
+
+def adaptive_sort(array, key):
+    """
+    Сортирует список словарей по указанному ключу по возрастанию.
+    Сортировка устойчива; на упорядоченном списке выполняется одна линейная
+    проверка, на почти упорядоченном — слияние нескольких серий.
+    """
+    length = len(array)
+    if length < 2:
+        return
+
+    runs = []
+    start = 0
+    while start < length:
+        end = _count_run(array, key, start, length)
+        if end == length and start == 0:
+            return
+        if end - start < MIN_RUN:
+            forced_end = min(start + MIN_RUN, length)
+            _binary_insertion_sort(array, key, start, forced_end, end)
+            end = forced_end
+        runs.append((start, end))
+        start = end
+
+    while len(runs) > 1:
+        merged_runs = []
+        for run_index in range(0, len(runs) - 1, 2):
+            left_start, middle = runs[run_index]
+            _, right_end = runs[run_index + 1]
+            _merge(array, key, left_start, middle, right_end)
+            merged_runs.append((left_start, right_end))
+        if len(runs) % 2:
+            merged_runs.append(runs[-1])
+        runs = merged_runs
@@ -0,0 +1,397 @@
+"""
+Пакетный импорт банковских выписок (CSV/TSV) в файл бюджета.
+
+Файл читается потоком; столбцы сопоставляются полям транзакции через профиль.
+Даты и время проверяются по тем же правилам, что и при ручном вводе
+(validate_and_parse_date / validate_and_parse_time), порциями в параллельных
+процессах. Строки, уже присутствующие в бюджете, отбрасываются по хеш-множеству,
+а все новые записи добавляются одной отсортированной записью файла. Сверка
+с бюджетом и запись идут под исключительной блокировкой бюджета, чтобы
+параллельные изменения не потерялись.
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from data_loader import (
+    BUDGET_DATA_FILE,
+    iter_budget_transactions,
+    save_budget_transactions,
+)
+from ledger_lock import exclusive_ledger_lock
+from utils import tuple_to_date, validate_and_parse_date, validate_and_parse_time
+
+TRANSACTION_FIELDS = ('date', 'time', 'direction', 'category', 'amount', 'counterparty')
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# Символы, которые нельзя записать в поле строки бюджета (поля разделены табуляцией)
+LEDGER_SEPARATORS = ('\t', '\r', '\n')
+
+# Профиль описывает формат выписки:
+#   'delimiter'        — разделитель столбцов;
+#   'encoding'         — кодировка файла;
+#   'has_header'       — есть ли строка заголовка;
+#   'columns'          — поле транзакции -> имя столбца (или номер, начиная с 0);
+#                        None означает, что столбца нет;
+#   'date_order'       — 'ymd' (ГГГГ-ММ-ДД) или 'dmy' (ДД.ММ.ГГГГ);
+#   'direction_values' — значение столбца направления -> 'приход' / 'расход';
+#                        без столбца направления оно определяется знаком суммы;
+#   'decimal_comma'    — используется ли запятая как десятичный разделитель;
+#   'default_time'     — время для выписок без столбца времени.
+IMPORT_PROFILES = {
+    'csv': {
+        'delimiter': ',',
+        'encoding': 'utf-8',
+        'has_header': True,
+        'columns': {field: field for field in TRANSACTION_FIELDS},
+        'date_order': 'ymd',
+        'direction_values': {'приход': 'приход', 'расход': 'расход'},
+        'decimal_comma': False,
+        'default_time': '00:00',
+    },
+    'tsv': {
+        'delimiter': '\t',
+        'encoding': 'utf-8',
+        'has_header': True,
+        'columns': {field: field for field in TRANSACTION_FIELDS},
+        'date_order': 'ymd',
+        'direction_values': {'приход': 'приход', 'расход': 'расход'},
+        'decimal_comma': False,
+        'default_time': '00:00',
+    },
+}
+
+
+def _resolve_column_indexes(profile, header):
+    """Преобразует сопоставление столбцов профиля в номера столбцов."""
+    column_indexes = {}
+    for field in TRANSACTION_FIELDS:
+        column = profile['columns'].get(field)
+        if column is None or isinstance(column, int):
+            column_indexes[field] = column
+        elif header is None:
+            raise ValueError(
+                f"Столбец '{column}' задан по имени, но у файла нет заголовка."
+            )
+        elif column not in header:
+            raise ValueError(f"В заголовке нет столбца '{column}'.")
+        else:
+            column_indexes[field] = header.index(column)
+    return column_indexes
+
+
+def _iter_raw_rows(path, profile):
+    """
+    Потоково читает выписку.
+    Выдаёт кортежи (номер строки, дата, время, направление, категория, сумма,
+    контрагент) с необработанными значениями; отсутствующие столбцы дают None.
+    """
+    with open(path, 'r', encoding=profile['encoding'], newline='') as file:
+        reader = csv.reader(file, delimiter=profile['delimiter'])
+        header = next(reader, None) if profile['has_header'] else None
+        if header is not None:
+            header = [name.strip() for name in header]
+        column_indexes = _resolve_column_indexes(profile, header)
+
+        first_line_number = 2 if profile['has_header'] else 1
+        for line_number, row in enumerate(reader, start=first_line_number):
+            if not row:
+                continue
+            raw_values = []
+            for field in TRANSACTION_FIELDS:
+                column_index = column_indexes[field]
+                if column_index is None or column_index >= len(row):
+                    raw_values.append(None)
+                else:
+                    raw_values.append(row[column_index].strip())
+            yield (line_number, *raw_values)
+
+
+def _normalize_date(raw_date, date_order):
+    """Приводит дату к 'ГГГГ-ММ-ДД'. Возвращает строку или None."""
+    if not raw_date:
+        return None
+    if date_order == 'dmy':
+        parts = raw_date.replace('/', '.').replace('-', '.').split('.')
+        if len(parts) != 3:
+            return None
+        try:
+            day, month, year = (int(part) for part in parts)
+        except ValueError:
+            return None
+        raw_date = tuple_to_date(year, month, day)
+    if validate_and_parse_date(raw_date) is None:
+        return None
+    return raw_date
+
+
+def _parse_amount(raw_amount, decimal_comma):
+    """Разбирает сумму, допуская пробелы между разрядами. Возвращает float или None."""
+    if not raw_amount:
+        return None
+    cleaned = raw_amount.replace(' ', '').replace('\u00a0', '')
+    if decimal_comma:
+        cleaned = cleaned.replace('.', '').replace(',', '.')
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+def _has_line_breaking_characters(value):
+    """Проверяет, есть ли в тексте табуляция или перевод строки, ломающие строку бюджета."""
+    return value is not None and any(character in value for character in LEDGER_SEPARATORS)
+
+
+def _validate_row(raw_row, profile):
+    """
+    Проверяет одну строку выписки.
+    Возвращает (транзакция, None) или (None, причина отказа).
+    """
+    _, raw_date, raw_time, raw_direction, raw_category, raw_amount, raw_counterparty = raw_row
+
+    date_str = _normalize_date(raw_date, profile['date_order'])
+    if date_str is None:
+        return None, 'дата'
+
+    if raw_time is None:
+        raw_time = profile['default_time']
+    parsed_time = validate_and_parse_time(raw_time)
+    if parsed_time is None:
+        return None, 'время'
+    time_str = f"{parsed_time[0]:02d}:{parsed_time[1]:02d}"
+
+    amount = _parse_amount(raw_amount, profile['decimal_comma'])
+    if amount is None:
+        return None, 'сумма'
+
+    if raw_direction is None:
+        direction = 'расход' if amount < 0 else 'приход'
+    else:
+        direction = profile['direction_values'].get(raw_direction.lower())
+        if direction is None:
+            return None, 'направление'
+    amount = abs(amount)
+
+    if _has_line_breaking_characters(raw_category):
+        return None, 'категория'
+    if _has_line_breaking_characters(raw_counterparty):
+        return None, 'контрагент'
+
+    return {
+        'date': date_str,
+        'time': time_str,
+        'direction': direction,
+        'category': raw_category or "Без категории",
+        'amount': amount,
+        'counterparty': raw_counterparty or "Неизвестный",
+    }, None
+
+
+def _validate_chunk(raw_rows, profile):
+    """
+    Проверяет порцию строк (выполняется в рабочем процессе).
+    Возвращает (список транзакций, список (номер строки, причина)).
+    """
+    valid_rows = []
+    rejected_rows = []
+    for raw_row in raw_rows:
+        transaction, reason = _validate_row(raw_row, profile)
+        if transaction is None:
+            rejected_rows.append((raw_row[0], reason))
+        else:
+            valid_rows.append(transaction)
+    return valid_rows, rejected_rows
+
+
+def _iter_chunks(iterable, chunk_size):
+    """Разбивает поток на списки длиной не больше chunk_size."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_validated_chunks(raw_rows, profile, workers, chunk_size):
+    """
+    Проверяет порции в пуле процессов, сохраняя порядок порций.
+    В работе одновременно не больше 2 * workers порций, поэтому память
+    не растёт с размером файла.
+    """
+    chunks = _iter_chunks(raw_rows, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield _validate_chunk(chunk, profile)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for chunk in chunks:
+            pending.append(executor.submit(_validate_chunk, chunk, profile))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def _transaction_identity(transaction):
+    """Ключ для поиска дубликатов."""
+    return (
+        transaction['date'],
+        transaction['time'],
+        transaction['direction'],
+        transaction['category'],
+        float(transaction['amount']),
+        transaction['counterparty'],
+    )
+
+
+def _load_existing_identities(ledger_path):
+    """Потоково собирает множество ключей транзакций, уже записанных в бюджет."""
+    symbol_table = {}
+    try:
+        return {
+            _transaction_identity(transaction)
+            for transaction in iter_budget_transactions(symbol_table, ledger_path)
+        }
+    except FileNotFoundError:
+        return set()
+
+
+def import_bank_statement(path, profile='csv', workers=None,
+                          chunk_size=DEFAULT_CHUNK_SIZE,
+                          memory_limit_bytes=None, temp_dir=None,
+                          ledger_path=None):
+    """
+    Импортирует банковскую выписку в файл бюджета.
+
+    profile — имя профиля из IMPORT_PROFILES или словарь профиля;
+    workers — число процессов проверки (None — по числу процессоров,
+    1 — проверка в текущем процессе);
+    memory_limit_bytes / temp_dir — передаются в save_budget_transactions
+    для внешней сортировки больших бюджетов;
+    ledger_path — файл бюджета (по умолчанию BUDGET_DATA_FILE).
+
+    Возвращает словарь статистики или None при ошибке.
+    """
+    if isinstance(profile, str):
+        if profile not in IMPORT_PROFILES:
+            print(f" Неизвестный профиль импорта: '{profile}'.")
+            return None
+        profile = IMPORT_PROFILES[profile]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if ledger_path is None:
+        ledger_path = BUDGET_DATA_FILE
+
+    started_at = time.perf_counter()
+    new_transactions = []
+    rows_read = 0
+    rejected_by_reason = {}
+    try:
+        raw_rows = _iter_raw_rows(path, profile)
+        for valid_rows, rejected_rows in _iter_validated_chunks(
+                raw_rows, profile, workers, chunk_size):
+            rows_read += len(valid_rows) + len(rejected_rows)
+            for _, reason in rejected_rows:
+                rejected_by_reason[reason] = rejected_by_reason.get(reason, 0) + 1
+            new_transactions.extend(valid_rows)
+    except FileNotFoundError:
+        print(f" Файл выписки '{path}' не найден.")
+        return None
+    except (ValueError, UnicodeDecodeError, csv.Error) as error:
+        print(f" Ошибка при чтении выписки: {error}")
+        return None
+
+    with exclusive_ledger_lock(ledger_path):
+        # Бюджет сверяется только под блокировкой: записи, добавленные
+        # другим процессом во время проверки выписки, тоже считаются.
+        # Одинаковые строки внутри самой выписки — это разные покупки,
+        # поэтому они сверяются только с бюджетом, но не друг с другом.
+        known_identities = _load_existing_identities(ledger_path)
+        statement_count = len(new_transactions)
+        new_transactions = [
+            transaction
+            for transaction in new_transactions
+            if _transaction_identity(transaction) not in known_identities
+        ]
+        duplicate_count = statement_count - len(new_transactions)
+
+        if new_transactions:
+            if os.path.exists(ledger_path):
+                merged = itertools.chain(
+                    iter_budget_transactions(path=ledger_path), new_transactions
+                )
+                if memory_limit_bytes is None:
+                    merged = list(merged)
+            else:
+                merged = new_transactions
+            saved = save_budget_transactions(
+                merged,
+                memory_limit_bytes=memory_limit_bytes,
+                temp_dir=temp_dir,
+                path=ledger_path,
+            )
+            if not saved:
+                print(" Импорт не выполнен: бюджет не удалось сохранить.")
+                return None
+
+    elapsed = time.perf_counter() - started_at
+    stats = {
+        'rows_read': rows_read,
+        'imported': len(new_transactions),
+        'duplicates': duplicate_count,
+        'rejected': sum(rejected_by_reason.values()),
+        'rejected_by_reason': rejected_by_reason,
+        'seconds': elapsed,
+        'rows_per_second': rows_read / elapsed if elapsed > 0 else 0.0,
+    }
+    _print_import_summary(stats)
+    return stats
+
+
+def _print_import_summary(stats):
+    """Выводит итоги импорта."""
+    print(f"\n Импорт завершён за {stats['seconds']:.2f} с "
+          f"({stats['rows_per_second']:.0f} строк/с).")
+    print(f" Прочитано строк: {stats['rows_read']}")
+    print(f" Добавлено: {stats['imported']}")
+    print(f" Дубликатов: {stats['duplicates']}")
+    print(f" Отклонено: {stats['rejected']}")
+    for reason, count in sorted(stats['rejected_by_reason'].items()):
+        print(f"   некорректное поле '{reason}': {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Импорт банковской выписки в файл бюджета."
+    )
+    parser.add_argument('path', help="CSV/TSV-файл выписки")
+    parser.add_argument('--profile', default=None,
+                        help="профиль импорта (по умолчанию — по расширению файла)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="число процессов проверки")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="строк в одной порции проверки")
+    arguments = parser.parse_args()
+
+    profile = arguments.profile
+    if profile is None:
+        profile = 'tsv' if arguments.path.lower().endswith('.tsv') else 'csv'
+    import_bank_statement(
+        arguments.path,
+        profile=profile,
+        workers=arguments.workers,
+        chunk_size=arguments.chunk_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
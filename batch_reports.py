@@ -0,0 +1,245 @@
+"""
+Пакетное построение одного отчёта по каталогу бюджетов в пуле процессов.
+
+Каждый файл бюджета обрабатывается отдельной задачей ProcessPoolExecutor.
+Задачи отправляются не больше, чем есть рабочих процессов, поэтому отсчёт
+тайм-аута от отправки совпадает с началом обработки. Строки всех бюджетов
+собираются в общий результат (с полем 'ledger' — именем файла) в порядке
+списка бюджетов, а для каждого бюджета записывается время обработки и итог.
+Сообщения об ошибках и таблица времени выводятся в stderr, поэтому выгрузка
+в stdout остаётся машиночитаемой.
+"""
+
+import argparse
+import contextlib
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from report_export import (
+    EXPORT_FIELDS,
+    close_report_sink,
+    open_report_sink,
+    write_report_row,
+)
+from ledger_lock import LOCK_FILE_SUFFIX
+from reports import REPORT_TYPES, check_report_spec, run_report_spec
+
+BATCH_EXPORT_FIELDS = ('ledger',) + EXPORT_FIELDS
+DEFAULT_LEDGER_PATTERN = '*.txt*'
+
+
+def list_ledger_files(directory, pattern=DEFAULT_LEDGER_PATTERN):
+    """Возвращает отсортированный список файлов бюджета в каталоге (без файлов блокировки)."""
+    return sorted(
+        path
+        for path in glob.glob(os.path.join(directory, pattern))
+        if os.path.isfile(path) and not path.endswith(LOCK_FILE_SUFFIX)
+    )
+
+
+def _run_ledger_report(ledger_path, report_spec):
+    """
+    Строит отчёт по одному бюджету (в рабочем процессе). Возвращает (строки, секунды).
+    Сообщения загрузчика идут в stderr, чтобы не смешиваться с выгрузкой в stdout.
+    """
+    started_at = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        rows = run_report_spec(report_spec, ledger_path)
+    return rows, time.perf_counter() - started_at
+
+
+def _terminate_workers(executor):
+    """
+    Останавливает пул вместе с рабочими процессами, в том числе зависшими.
+    С Python 3.14 для этого есть ProcessPoolExecutor.terminate_workers;
+    в более ранних версиях открытого способа прервать задачу нет, и процессы
+    берутся из внутреннего словаря _processes (есть во всех версиях 3.x до 3.14).
+    """
+    if sys.version_info >= (3, 14):
+        executor.terminate_workers()
+        return
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def run_batch_reports(ledger_paths, report_spec, sink=None, workers=None, timeout=None):
+    """
+    Строит отчёт report_spec (см. reports.build_report_query) по каждому бюджету.
+
+    sink — приёмник report_export для общего результата; если он не задан,
+    строки возвращаются списком;
+    workers — число процессов (по умолчанию по числу процессоров);
+    timeout — предельное время обработки одного бюджета в секундах.
+
+    Строки выдаются в порядке ledger_paths: результат бюджета, обработанного
+    раньше предыдущих, ждёт, пока они не будут готовы. Если бюджет не уложился
+    в timeout, завершается весь пул: вместе с зависшим процессом прерываются
+    и все остальные бюджеты, обрабатываемые в этот момент, и они строятся
+    заново с начала в новом пуле (их тайм-аут отсчитывается заново).
+
+    Возвращает словарь:
+    'rows' — общий список строк (пустой, если передан sink),
+    'timings' — список {'ledger', 'status', 'rows', 'seconds'} в порядке ledger_paths,
+    где status — 'ok', 'timeout', 'error' или 'not_loaded'.
+    Неверное описание отчёта вызывает ValueError до запуска пула.
+    """
+    check_report_spec(report_spec)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    combined_rows = []
+    timings = {}
+    finished_rows = {}
+    next_to_write = 0
+    pending_paths = list(ledger_paths)
+    pending_paths.reverse()
+    in_flight = {}
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while pending_paths or in_flight:
+            while pending_paths and len(in_flight) < workers:
+                ledger_path = pending_paths.pop()
+                future = executor.submit(_run_ledger_report, ledger_path, report_spec)
+                in_flight[future] = (ledger_path, time.monotonic())
+
+            wait_timeout = None
+            if timeout is not None:
+                earliest = min(submitted_at for _, submitted_at in in_flight.values())
+                wait_timeout = max(0.0, earliest + timeout - time.monotonic())
+            done, _ = wait(list(in_flight), timeout=wait_timeout,
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                ledger_path, _ = in_flight.pop(future)
+                finished_rows[ledger_path] = []
+                try:
+                    rows, seconds = future.result()
+                except Exception as error:
+                    print(f" Ошибка при обработке '{ledger_path}': {error}", file=sys.stderr)
+                    timings[ledger_path] = _timing(ledger_path, 'error', 0, 0.0)
+                    continue
+                if rows is None:
+                    timings[ledger_path] = _timing(ledger_path, 'not_loaded', 0, seconds)
+                    continue
+                finished_rows[ledger_path] = rows
+                timings[ledger_path] = _timing(ledger_path, 'ok', len(rows), seconds)
+
+            if timeout is not None:
+                now = time.monotonic()
+                expired = [
+                    future
+                    for future, (_, submitted_at) in in_flight.items()
+                    if now - submitted_at >= timeout
+                ]
+                if expired:
+                    for future in expired:
+                        ledger_path, _ = in_flight.pop(future)
+                        finished_rows[ledger_path] = []
+                        timings[ledger_path] = _timing(ledger_path, 'timeout', 0, timeout)
+                    # Зависший процесс нельзя освободить иначе, как завершив пул;
+                    # незаконченные бюджеты отправляются в новый пул первыми.
+                    _terminate_workers(executor)
+                    restarted = [ledger_path for ledger_path, _ in in_flight.values()]
+                    in_flight.clear()
+                    pending_paths.extend(reversed(restarted))
+                    executor = ProcessPoolExecutor(max_workers=workers)
+
+            while (next_to_write < len(ledger_paths)
+                   and ledger_paths[next_to_write] in finished_rows):
+                ledger_path = ledger_paths[next_to_write]
+                ledger_name = os.path.basename(ledger_path)
+                for row in finished_rows.pop(ledger_path):
+                    row = dict(row, ledger=ledger_name)
+                    if sink is None:
+                        combined_rows.append(row)
+                    else:
+                        write_report_row(sink, row)
+                next_to_write += 1
+    finally:
+        if in_flight:
+            _terminate_workers(executor)
+        else:
+            executor.shutdown()
+
+    return {
+        'rows': combined_rows,
+        'timings': [timings[ledger_path] for ledger_path in ledger_paths],
+    }
+
+
+def _timing(ledger_path, status, row_count, seconds):
+    """Запись о времени обработки одного бюджета."""
+    return {'ledger': ledger_path, 'status': status, 'rows': row_count, 'seconds': seconds}
+
+
+def print_batch_timings(timings, file=None):
+    """Выводит время обработки каждого бюджета и итоги в file (по умолчанию stdout)."""
+    print(f"\n {'Бюджет':<40} | {'Итог':<10} | {'Строк':>7} | {'Время, с':>8}", file=file)
+    print("-" * 75, file=file)
+    for timing in timings:
+        print(
+            f" {os.path.basename(timing['ledger']):<40} | {timing['status']:<10} | "
+            f"{timing['rows']:>7} | {timing['seconds']:>8.3f}",
+            file=file,
+        )
+    succeeded = sum(1 for timing in timings if timing['status'] == 'ok')
+    print(f" Обработано: {succeeded} из {len(timings)}", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Построение отчёта по каталогу файлов бюджета."
+    )
+    parser.add_argument('directory', help="каталог с файлами бюджета")
+    parser.add_argument('--pattern', default=DEFAULT_LEDGER_PATTERN,
+                        help="шаблон имён файлов бюджета")
+    parser.add_argument('--report', choices=REPORT_TYPES, required=True)
+    parser.add_argument('--days', type=int, help="N для отчёта income")
+    parser.add_argument('--category', help="категория для отчёта category")
+    parser.add_argument('--start-time', help="начало интервала для отчёта interval")
+    parser.add_argument('--end-time', help="конец интервала для отчёта interval")
+    parser.add_argument('--output', default='-',
+                        help="файл .csv, .tsv или .jsonl (по умолчанию CSV в стандартный вывод)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="предельное время на один бюджет, с")
+    arguments = parser.parse_args()
+
+    report_spec = {
+        'income': {'report': 'income', 'days': arguments.days},
+        'category': {'report': 'category', 'category': arguments.category},
+        'interval': {
+            'report': 'interval',
+            'start_time': arguments.start_time,
+            'end_time': arguments.end_time,
+        },
+    }[arguments.report]
+    try:
+        check_report_spec(report_spec)
+    except ValueError as error:
+        parser.error(str(error))
+
+    ledger_paths = list_ledger_files(arguments.directory, arguments.pattern)
+    export_format = 'csv' if arguments.output == '-' else None
+    sink = open_report_sink(arguments.output, export_format, fields=BATCH_EXPORT_FIELDS)
+    try:
+        result = run_batch_reports(
+            ledger_paths,
+            report_spec,
+            sink=sink,
+            workers=arguments.workers,
+            timeout=arguments.timeout,
+        )
+    finally:
+        close_report_sink(sink)
+    print_batch_timings(result['timings'], file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
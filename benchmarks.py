@@ -0,0 +1,438 @@
+"""
+Замеры производительности на сгенерированных бюджетах.
+
+Запуск:  python benchmarks.py <замер> [--rows N]
+Файлы создаются во временном каталоге и удаляются после замера.
+"""
+
+import argparse
+import contextlib
+import gc
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import data_loader
+from adaptive_sort import adaptive_sort
+from heap_sort import heap_sort
+from ledger_io import open_ledger_for_reading, open_ledger_for_writing
+from query import run_query
+from reports import category_expense_query, category_report_specs, run_report_queries
+from utils import chronological_sort_key, tuple_to_date
+
+_SAMPLE_CATEGORIES = (
+    'питание', 'транспорт', 'развлечения', 'подарок', 'одежда', 'аптека',
+    'зарплата', 'аванс', 'фриланс', 'дивиденды',
+)
+_SAMPLE_COUNTERPARTIES = (
+    'Работодатель АО', 'Ресторан', 'Столовая', 'Кафе', 'Метро', 'Автобус',
+    'Такси', 'Кино', 'Театр', 'Бутик', 'Аптека Здоровье', 'Брокер ООО',
+    'Клиент ИП', 'Мама', 'Коллега',
+)
+
+
+def generate_ledger_lines(row_count, seed=0):
+    """Выдаёт строки хронологически отсортированного бюджета длиной row_count."""
+    generator = random.Random(seed)
+    rows_per_day = max(1, row_count // 3650)
+    year, month, day = 2000, 1, 1
+    for row_index in range(row_count):
+        if row_index and row_index % rows_per_day == 0:
+            day += 1
+            if day > 28:
+                day = 1
+                month += 1
+                if month > 12:
+                    month = 1
+                    year += 1
+        direction = 'приход' if generator.random() < 0.2 else 'расход'
+        yield "\t".join((
+            tuple_to_date(year, month, day),
+            f"{generator.randint(0, 23):02d}:{generator.randint(0, 59):02d}",
+            direction,
+            generator.choice(_SAMPLE_CATEGORIES),
+            str(float(generator.randint(1, 500000)) / 100),
+            generator.choice(_SAMPLE_COUNTERPARTIES),
+        )) + "\n"
+
+
+def write_ledger(path, row_count, seed=0):
+    """Записывает сгенерированный бюджет в файл."""
+    with open(path, 'w', encoding='utf-8') as file:
+        file.writelines(generate_ledger_lines(row_count, seed))
+
+
+def _measure_load(ledger_path, intern_strings):
+    """Возвращает (секунды загрузки, секунды запроса, байт памяти под бюджет)."""
+    gc.collect()
+    symbol_table = {} if intern_strings else None
+    started_at = time.perf_counter()
+    transactions = data_loader.load_budget_transactions(
+        intern_strings, ledger_path, symbol_table=symbol_table
+    )
+    load_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    run_query(transactions, category_expense_query('питание'), symbol_table)
+    query_seconds = time.perf_counter() - started_at
+    del transactions, symbol_table
+
+    gc.collect()
+    tracemalloc.start()
+    transactions = data_loader.load_budget_transactions(intern_strings, ledger_path)
+    gc.collect()
+    memory_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del transactions
+    return load_seconds, query_seconds, memory_bytes
+
+
+def benchmark_interning(row_count):
+    """Сравнивает загрузку с таблицей символов и без неё."""
+    temp_dir = tempfile.mkdtemp(prefix='budget_bench_')
+    ledger_path = os.path.join(temp_dir, 'budget_data.txt')
+    write_ledger(ledger_path, row_count)
+    try:
+        print(f"\n Интернирование строк, {row_count} записей")
+        print(f" {'Режим':<18} | {'Загрузка, с':>11} | {'Запрос, с':>9} | {'Память, МБ':>10}")
+        print("-" * 60)
+        for label, intern_strings in (("без таблицы", False), ("таблица символов", True)):
+            load_seconds, query_seconds, memory_bytes = _measure_load(ledger_path, intern_strings)
+            print(
+                f" {label:<18} | {load_seconds:>11.2f} | {query_seconds:>9.2f} | "
+                f"{memory_bytes / 2 ** 20:>10.1f}"
+            )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _write_compressed_copy(source_path, target_path, compression_level):
+    """Копирует бюджет в target_path, сжимая его по расширению target_path."""
+    with open(source_path, 'r', encoding='utf-8') as source_file, \
+            open_ledger_for_writing(target_path, compression_level) as target_file:
+        shutil.copyfileobj(source_file, target_file, 1024 * 1024)
+
+
+def _measure_decode_seconds(path):
+    """Время потокового чтения всех строк файла без разбора."""
+    started_at = time.perf_counter()
+    with open_ledger_for_reading(path) as file:
+        for _ in file:
+            pass
+    return time.perf_counter() - started_at
+
+
+def benchmark_compression(row_count, compression_level=6):
+    """
+    Сравнивает степень сжатия и время загрузки обычного, .gz, .bz2 и .xz
+    бюджетов размером row_count / 100, row_count / 10 и row_count записей.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='budget_bench_')
+    try:
+        print(f"\n Сжатие бюджета (уровень {compression_level})")
+        print(
+            f" {'Записей':>9} | {'Формат':<6} | {'Размер, МБ':>10} | {'Сжатие':>6} | "
+            f"{'Распаковка, с':>13} | {'Загрузка, с':>11}"
+        )
+        print("-" * 72)
+        for size in sorted({max(1, row_count // 100), max(1, row_count // 10), row_count}):
+            plain_path = os.path.join(temp_dir, f'budget_{size}.txt')
+            write_ledger(plain_path, size)
+            plain_bytes = os.path.getsize(plain_path)
+            for label, extension in (("текст", ''), ("gzip", '.gz'), ("bz2", '.bz2'), ("xz", '.xz')):
+                ledger_path = plain_path + extension
+                if extension:
+                    _write_compressed_copy(plain_path, ledger_path, compression_level)
+                ledger_bytes = os.path.getsize(ledger_path)
+                decode_seconds = _measure_decode_seconds(ledger_path)
+
+                started_at = time.perf_counter()
+                data_loader.load_budget_transactions(path=ledger_path)
+                load_seconds = time.perf_counter() - started_at
+                print(
+                    f" {size:>9} | {label:<6} | {ledger_bytes / 2 ** 20:>10.2f} | "
+                    f"{plain_bytes / ledger_bytes:>6.1f} | {decode_seconds:>13.3f} | "
+                    f"{load_seconds:>11.3f}"
+                )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _sort_inputs(row_count):
+    """Возвращает {название: список} упорядоченного, почти упорядоченного и случайного входа."""
+    generator = random.Random(1)
+    ordered = []
+    for line in generate_ledger_lines(row_count):
+        date_str, time_str, _ = line.split('\t', 2)
+        ordered.append({'_sort_key': chronological_sort_key(date_str, time_str)})
+    ordered.sort(key=lambda row: row['_sort_key'])
+
+    nearly_ordered = list(ordered)
+    # Как после add_transaction и update_transaction: одна запись в конце
+    # и одна изменённая запись в середине.
+    nearly_ordered.append({'_sort_key': ordered[len(ordered) // 2]['_sort_key']})
+    nearly_ordered[len(ordered) // 3] = {'_sort_key': ordered[-1]['_sort_key']}
+
+    shuffled = list(ordered)
+    generator.shuffle(shuffled)
+    return {
+        "упорядоченный": ordered,
+        "почти упорядоч.": nearly_ordered,
+        "случайный": shuffled,
+    }
+
+
+def benchmark_sorting(row_count):
+    """Сравнивает heap_sort и adaptive_sort на разных входах."""
+    print(f"\n Сортировка при сохранении, {row_count} записей")
+    print(f" {'Вход':<16} | {'heap_sort, с':>12} | {'adaptive_sort, с':>16}")
+    print("-" * 52)
+    for label, rows in _sort_inputs(row_count).items():
+        heap_input = [dict(row) for row in rows]
+        started_at = time.perf_counter()
+        heap_sort(heap_input, '_sort_key', reverse=False)
+        heap_seconds = time.perf_counter() - started_at
+
+        adaptive_input = [dict(row) for row in rows]
+        started_at = time.perf_counter()
+        adaptive_sort(adaptive_input, '_sort_key')
+        adaptive_seconds = time.perf_counter() - started_at
+
+        print(f" {label:<16} | {heap_seconds:>12.3f} | {adaptive_seconds:>16.3f}")
+
+
+def _concurrent_reader(ledger_path, min_count, max_count, stop_event, result_queue):
+    """
+    Читает бюджет в цикле, пока не установлен stop_event, и проверяет каждый
+    снимок: он загружается целиком, а число записей не выходит за пределы
+    и не уменьшается от снимка к снимку.
+    """
+    read_count = 0
+    error_count = 0
+    previous_count = min_count
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        while not stop_event.is_set():
+            transactions, version = data_loader.load_budget_snapshot(
+                path=ledger_path, create_if_missing=False
+            )
+            read_count += 1
+            if transactions is None or version is None:
+                error_count += 1
+                continue
+            if not previous_count <= len(transactions) <= max_count:
+                error_count += 1
+            previous_count = len(transactions)
+    result_queue.put(('reader', read_count, error_count))
+
+
+def _concurrent_writer(ledger_path, writer_index, add_count, result_queue):
+    """Добавляет add_count записей через add_transaction."""
+    failed_count = 0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for add_index in range(add_count):
+            added = data_loader.add_transaction({
+                'date': '2030-01-01',
+                'time': '12:00',
+                'direction': 'расход',
+                'category': 'нагрузка',
+                'amount': float(add_index + 1),
+                'counterparty': f'Писатель {writer_index}',
+            }, path=ledger_path)
+            if not added:
+                failed_count += 1
+    result_queue.put(('writer', add_count, failed_count))
+
+
+def _run_readers(ledger_path, reader_count, min_count, max_count, writer_args, seconds):
+    """
+    Запускает reader_count читателей и писателей с аргументами writer_args.
+    Без писателей чтение длится seconds секунд, иначе — пока писатели не закончат.
+    Возвращает (секунды, чтений, ошибок чтения, неудачных записей).
+    """
+    stop_event = multiprocessing.Event()
+    result_queue = multiprocessing.Queue()
+    readers = [
+        multiprocessing.Process(
+            target=_concurrent_reader,
+            args=(ledger_path, min_count, max_count, stop_event, result_queue),
+        )
+        for _ in range(reader_count)
+    ]
+    writers = [
+        multiprocessing.Process(target=_concurrent_writer, args=args + (result_queue,))
+        for args in writer_args
+    ]
+    started_at = time.perf_counter()
+    for process in readers + writers:
+        process.start()
+    if writers:
+        for process in writers:
+            process.join()
+    else:
+        time.sleep(seconds)
+    stop_event.set()
+    for process in readers:
+        process.join()
+    elapsed = time.perf_counter() - started_at
+
+    read_count = read_errors = failed_writes = 0
+    for _ in range(len(readers) + len(writers)):
+        role, count, errors = result_queue.get()
+        if role == 'reader':
+            read_count += count
+            read_errors += errors
+        else:
+            failed_writes += errors
+    return elapsed, read_count, read_errors, failed_writes
+
+
+def benchmark_report_pack(row_count, repeats=4):
+    """
+    Сравнивает пакет отчётов (по каждой категории repeats раз, плюс отчёты 1 и 3),
+    построенный отдельными запросами и одним проходом run_report_queries.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='budget_bench_')
+    ledger_path = os.path.join(temp_dir, 'budget_data.txt')
+    write_ledger(ledger_path, row_count)
+    try:
+        symbol_table = {}
+        transactions = data_loader.load_budget_transactions(
+            path=ledger_path, symbol_table=symbol_table
+        )
+        report_specs = category_report_specs(_SAMPLE_CATEGORIES * repeats) + [
+            {'report': 'income', 'days': 30},
+            {'report': 'interval', 'start_time': '18:00', 'end_time': '21:00'},
+        ]
+
+        started_at = time.perf_counter()
+        separate_results = [
+            run_report_queries(transactions, [report_spec], symbol_table)[0]
+            for report_spec in report_specs
+        ]
+        separate_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        pack_results = run_report_queries(transactions, report_specs, symbol_table)
+        pack_seconds = time.perf_counter() - started_at
+
+        print(f"\n Пакет из {len(report_specs)} отчётов, {row_count} записей")
+        print(f" {'Режим':<20} | {'Время, с':>8}")
+        print("-" * 33)
+        print(f" {'отдельные проходы':<20} | {separate_seconds:>8.2f}")
+        print(f" {'один проход':<20} | {pack_seconds:>8.2f}")
+        if separate_results != pack_results:
+            print(" РЕЗУЛЬТАТЫ РАЗЛИЧАЮТСЯ")
+            return False
+        return True
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _stale_version_is_refused(ledger_path):
+    """
+    Проверяет оптимистическую проверку версии: изменение и удаление по
+    устаревшему снимку отклоняются, а по свежему — выполняются.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        transactions, stale_version = data_loader.load_budget_snapshot(path=ledger_path)
+        data_loader.add_transaction(dict(transactions[0]), path=ledger_path)
+        stale_update = data_loader.update_transaction(
+            0, dict(transactions[1]), path=ledger_path, expected_version=stale_version
+        )
+        stale_delete = data_loader.delete_transaction(
+            0, path=ledger_path, expected_version=stale_version
+        )
+        _, fresh_version = data_loader.load_budget_snapshot(path=ledger_path)
+        fresh_delete = data_loader.delete_transaction(
+            0, path=ledger_path, expected_version=fresh_version
+        )
+    return not stale_update and not stale_delete and fresh_delete
+
+
+def benchmark_concurrency(row_count, reader_count=4, writer_count=2, adds_per_writer=25):
+    """
+    Нагрузочная проверка параллельного доступа: пропускная способность
+    читателей без писателей и с ними, отсутствие потерянных записей
+    при одновременном добавлении несколькими процессами и отказ изменений
+    по устаревшей версии снимка.
+    Возвращает False, если хотя бы одна проверка не пройдена.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='budget_bench_')
+    ledger_path = os.path.join(temp_dir, 'budget_data.txt')
+    write_ledger(ledger_path, row_count)
+    expected_count = row_count + writer_count * adds_per_writer
+    try:
+        print(f"\n Параллельный доступ, {row_count} записей, читателей: {reader_count}")
+        print(f" {'Режим':<22} | {'Время, с':>8} | {'Чтений/с':>8} | {'Ошибок':>6}")
+        print("-" * 54)
+        elapsed, read_count, idle_read_errors, _ = _run_readers(
+            ledger_path, reader_count, row_count, row_count, [], 3.0
+        )
+        print(f" {'только чтение':<22} | {elapsed:>8.2f} | "
+              f"{read_count / elapsed:>8.1f} | {idle_read_errors:>6}")
+
+        writer_args = [
+            (ledger_path, writer_index, adds_per_writer)
+            for writer_index in range(writer_count)
+        ]
+        elapsed, read_count, read_errors, failed_writes = _run_readers(
+            ledger_path, reader_count, row_count, expected_count, writer_args, None
+        )
+        label = f"чтение, писателей: {writer_count}"
+        print(f" {label:<22} | {elapsed:>8.2f} | "
+              f"{read_count / elapsed:>8.1f} | {read_errors:>6}")
+        print(f" Записей добавлено: {writer_count * adds_per_writer} "
+              f"за {elapsed:.2f} с, неудачных: {failed_writes}")
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            final_count = len(data_loader.load_budget_transactions(path=ledger_path))
+        verdict = "потерь нет" if final_count == expected_count else "ПОТЕРЯНЫ ЗАПИСИ"
+        print(f" Итоговое число записей: {final_count} из {expected_count} ({verdict})")
+
+        stale_refused = _stale_version_is_refused(ledger_path)
+        verdict = "отклонены" if stale_refused else "НЕ ОТКЛОНЕНЫ"
+        print(f" Изменения по устаревшей версии: {verdict}")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    passed = (
+        idle_read_errors == 0
+        and read_errors == 0
+        and failed_writes == 0
+        and final_count == expected_count
+        and stale_refused
+    )
+    if not passed:
+        print(" ПРОВЕРКА НЕ ПРОЙДЕНА")
+    return passed
+
+
+BENCHMARKS = {
+    'interning': (benchmark_interning, 5_000_000),
+    'compression': (benchmark_compression, 1_000_000),
+    'sorting': (benchmark_sorting, 200_000),
+    'concurrency': (benchmark_concurrency, 20_000),
+    'report_pack': (benchmark_report_pack, 500_000),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности бюджета.")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--rows', type=int, default=None,
+                        help="число записей в сгенерированном бюджете")
+    arguments = parser.parse_args()
+
+    benchmark, default_rows = BENCHMARKS[arguments.benchmark]
+    # Нагрузочные проверки возвращают False, если результат неверен
+    if benchmark(arguments.rows or default_rows) is False:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,34 @@
-"""Модуль для загрузки, сохранения и управления транзакциями бюджета."""
+"""
+Модуль для загрузки, сохранения и управления транзакциями бюджета.
+Файл данных может быть сжат (.gz, .bz2, .xz) — см. ledger_io.
+Функции принимают необязательный path — путь к файлу бюджета;
+по умолчанию используется BUDGET_DATA_FILE.
+Файл перезаписывается атомарно, а изменения выполняются под исключительной
+блокировкой — см. ledger_lock.
+"""
 
-from utils import validate_and_parse_date
-from heap_sort import heap_sort
+import os
+
+from utils import chronological_sort_key, subtract_days_from_date, validate_and_parse_date
+from adaptive_sort import adaptive_sort
+from ledger_io import detect_compression, open_ledger_for_reading, replace_ledger_atomically
+from ledger_lock import exclusive_ledger_lock, file_version
+from external_sort import DEFAULT_MEMORY_LIMIT_BYTES, external_sort_lines
 
 BUDGET_DATA_FILE = "budget_data.txt"
+REVERSE_READ_BLOCK_SIZE = 64 * 1024
+
+
+def _ledger_path(path):
+    """Возвращает путь к файлу бюджета: переданный или BUDGET_DATA_FILE."""
+    return BUDGET_DATA_FILE if path is None else path
 
 
-def create_sample_budget_data():
+def create_sample_budget_data(path=None):
     """Создаёт файл с примерными транзакциями, если его ещё нет или он пуст."""
+    path = _ledger_path(path)
     try:
-        with open(BUDGET_DATA_FILE, 'r', encoding='utf-8') as file:
+        with open_ledger_for_reading(path) as file:
             content = file.read()
             if content.strip() == '':
                 print("Файл пуст. Создаю примерные записи...")
@@ -51,149 +70,393 @@ def create_sample_budget_data():
         ("2026-01-25", "16:45", "приход", "подработка", "7500.00", "Коллега"),
     ]
 
-    with open(BUDGET_DATA_FILE, 'w', encoding='utf-8') as file:
+    with replace_ledger_atomically(path) as file:
         for record in sample_records:
             file.write("\t".join(record) + "\n")
-    print(f" Файл '{BUDGET_DATA_FILE}' создан с {len(sample_records)} записями.\n")
+    print(f" Файл '{path}' создан с {len(sample_records)} записями.\n")
+
+
+def intern_symbol(symbol_table, value):
+    """
+    Возвращает единственный экземпляр строки value в таблице символов бюджета.
+    Повторяющиеся значения (направление, категория, контрагент, дата, время)
+    хранятся один раз, а их хеш вычисляется однажды, поэтому сравнения и
+    поиск по словарям в отчётах не пересчитывают его для каждой строки.
+    """
+    return symbol_table.setdefault(value, value)
+
+
+def parse_transaction_line(line, line_number, symbol_table=None):
+    """
+    Разбирает строку файла в словарь транзакции.
+    Если передана таблица символов, строковые поля заменяются её
+    единственными экземплярами (см. intern_symbol).
+    Возвращает None (с предупреждением) для строки неверного формата.
+    """
+    parts = line.strip().split('\t')
+    if len(parts) != 6:
+        print(f"  Неверный формат строки {line_number} — пропущена.")
+        return None
+
+    date_str, time_str, transaction_direction, category_name, amount_str, counterparty_name = parts
+    try:
+        amount_value = float(amount_str)
+    except ValueError:
+        print(f"  Некорректная сумма в строке {line_number} — пропущена.")
+        return None
+
+    if symbol_table is not None:
+        date_str = intern_symbol(symbol_table, date_str)
+        time_str = intern_symbol(symbol_table, time_str)
+        transaction_direction = intern_symbol(symbol_table, transaction_direction)
+        category_name = intern_symbol(symbol_table, category_name)
+        counterparty_name = intern_symbol(symbol_table, counterparty_name)
+
+    return {
+        'date': date_str,
+        'time': time_str,
+        'direction': transaction_direction,
+        'category': category_name,
+        'amount': amount_value,
+        'counterparty': counterparty_name,
+    }
+
+
+def _format_transaction_line(transaction):
+    """Преобразует словарь транзакции в строку файла (с переводом строки)."""
+    record = (
+        transaction['date'],
+        transaction['time'],
+        transaction['direction'],
+        transaction['category'],
+        str(transaction['amount']),
+        transaction['counterparty']
+    )
+    return "\t".join(record) + "\n"
+
+
+def iter_budget_transactions(symbol_table=None, path=None):
+    """
+    Потоково читает транзакции из файла, не загружая его целиком.
+    Строки неверного формата пропускаются с предупреждением.
+    """
+    path = _ledger_path(path)
+    with open_ledger_for_reading(path) as file:
+        for line_number, line in enumerate(file, start=1):
+            transaction_record = parse_transaction_line(line, line_number, symbol_table)
+            if transaction_record is not None:
+                yield transaction_record
+
+
+def load_budget_transactions(intern_strings=True, path=None, create_if_missing=True,
+                             symbol_table=None):
+    """
+    Загружает транзакции из файла. Возвращает список словарей или None при ошибке.
+    При intern_strings=True повторяющиеся строки хранятся в одной таблице
+    символов на весь бюджет: в переданной symbol_table (её можно затем отдать
+    query.run_queries) или в новой. Если файла нет и create_if_missing=True,
+    создаётся файл с примерными записями.
+    """
+    transactions, _ = load_budget_snapshot(
+        intern_strings, path, create_if_missing, symbol_table
+    )
+    return transactions
 
 
-def load_budget_transactions():
-    """Загружает транзакции из файла. Возвращает список словарей или None при ошибке."""
+def load_budget_snapshot(intern_strings=True, path=None, create_if_missing=True,
+                         symbol_table=None):
+    """
+    Загружает транзакции как load_budget_transactions и возвращает их вместе
+    с версией прочитанного снимка: (список, версия) или (None, None) при ошибке.
+    Версию можно передать в update_transaction / delete_transaction, чтобы
+    изменение не затёрло чужую запись, сделанную после чтения.
+    """
+    path = _ledger_path(path)
     try:
-        with open(BUDGET_DATA_FILE, 'r', encoding='utf-8') as file:
+        with open_ledger_for_reading(path) as file:
+            version = file_version(file)
             lines = file.readlines()
     except FileNotFoundError:
-        print(f" Файл '{BUDGET_DATA_FILE}' не найден.")
-        create_sample_budget_data()
-        return load_budget_transactions()
+        print(f" Файл '{path}' не найден.")
+        if not create_if_missing:
+            return None, None
+        create_sample_budget_data(path)
+        return load_budget_snapshot(intern_strings, path, symbol_table=symbol_table)
     except Exception as error:
         print(f" Ошибка при чтении файла: {error}")
-        return None
+        return None, None
 
+    if not intern_strings:
+        symbol_table = None
+    elif symbol_table is None:
+        symbol_table = {}
     transactions_list = []
     for line_number, line in enumerate(lines, start=1):
-        parts = line.strip().split('\t')
-        if len(parts) != 6:
-            print(f"  Неверный формат строки {line_number} — пропущена.")
-            continue
-
-        date_str, time_str, transaction_direction, category_name, amount_str, counterparty_name = parts
-        try:
-            amount_value = float(amount_str)
-        except ValueError:
-            print(f"  Некорректная сумма в строке {line_number} — пропущена.")
-            continue
-
-        transaction_record = {
-            'date': date_str,
-            'time': time_str,
-            'direction': transaction_direction,
-            'category': category_name,
-            'amount': amount_value,
-            'counterparty': counterparty_name,
-        }
-        transactions_list.append(transaction_record)
-
-    return transactions_list
+        transaction_record = parse_transaction_line(line, line_number, symbol_table)
+        if transaction_record is not None:
+            transactions_list.append(transaction_record)
+
+    return transactions_list, version
+
+
+def _iter_lines_reversed(file, block_size):
+    """Выдаёт строки двоичного файла с конца, читая его блоками по block_size байт."""
+    file.seek(0, os.SEEK_END)
+    position = file.tell()
+    remainder = b''
+    while position > 0:
+        read_size = min(block_size, position)
+        position -= read_size
+        file.seek(position)
+        block_lines = (file.read(read_size) + remainder).split(b'\n')
+        # Первая часть блока может быть концом строки из предыдущего блока
+        remainder = block_lines[0]
+        for raw_line in reversed(block_lines[1:]):
+            if raw_line:
+                yield raw_line
+    if remainder:
+        yield remainder
+
+
+def iter_budget_transactions_reversed(symbol_table=None, path=None,
+                                      block_size=REVERSE_READ_BLOCK_SIZE):
+    """
+    Читает транзакции с конца файла, блоками от EOF к началу.
+    Строки неверного формата пропускаются с предупреждением (номер считается
+    с конца файла). Сжатый файл читать с конца нельзя, поэтому он загружается
+    целиком и выдаётся в обратном порядке.
+    """
+    path = _ledger_path(path)
+    if detect_compression(path) is not None:
+        transactions = load_budget_transactions(
+            symbol_table is not None, path, create_if_missing=False,
+            symbol_table=symbol_table,
+        )
+        yield from reversed(transactions or [])
+        return
+
+    with open(path, 'rb') as file:
+        for line_number, raw_line in enumerate(_iter_lines_reversed(file, block_size), start=1):
+            transaction_record = parse_transaction_line(
+                raw_line.decode('utf-8'), f"{line_number} с конца", symbol_table
+            )
+            if transaction_record is not None:
+                yield transaction_record
+
+
+def load_recent_budget_transactions(number_of_days, path=None,
+                                    block_size=REVERSE_READ_BLOCK_SIZE, symbol_table=None):
+    """
+    Загружает только хвост хронологически отсортированного файла: записи
+    начиная с даты «последняя дата минус number_of_days» (см.
+    subtract_days_from_date). Файл читается с конца и чтение прекращается
+    после первой более ранней даты, поэтому для отчёта за последние дни
+    читается лишь небольшая часть большого файла.
+    Записи с невалидной датой (при сортировке они стоят в конце) сохраняются.
+    Если в прочитанной части порядок нарушен (например, сторонняя программа
+    дописала запись задним числом), файл загружается целиком: иначе записи
+    периода, стоящие раньше нарушения, были бы потеряны. Чтобы заметить
+    нарушение на границе периода, читается ещё одна запись после первой
+    более ранней даты; нарушения порядка глубже в файле не обнаруживаются.
+    symbol_table — таблица символов для строк (по умолчанию новая).
+    Возвращает список в хронологическом порядке или None при ошибке.
+    """
+    if not isinstance(number_of_days, int) or number_of_days < 0:
+        print("  Ошибка: N должно быть целым неотрицательным числом.")
+        return None
+
+    path = _ledger_path(path)
+    if symbol_table is None:
+        symbol_table = {}
+    if not os.path.exists(path):
+        return load_budget_transactions(path=path, symbol_table=symbol_table)
+
+    recent_transactions = []
+    start_date = None
+    previous_date = None
+    is_sorted = True
+    try:
+        for transaction in iter_budget_transactions_reversed(symbol_table, path, block_size):
+            date_str = transaction['date']
+            if validate_and_parse_date(date_str) is None:
+                # В упорядоченном файле невалидные даты стоят только в конце
+                if previous_date is not None:
+                    is_sorted = False
+                    break
+            elif previous_date is None:
+                start_date = subtract_days_from_date(date_str, number_of_days)
+                previous_date = date_str
+            elif date_str > previous_date:
+                is_sorted = False
+                break
+            elif previous_date < start_date:
+                # Предыдущая запись уже раньше периода, эта подтверждает порядок
+                break
+            else:
+                previous_date = date_str
+                if date_str < start_date:
+                    continue
+            recent_transactions.append(transaction)
+    except Exception as error:
+        print(f" Ошибка при чтении файла: {error}")
+        return None
+
+    if not is_sorted:
+        print("  Предупреждение: бюджет не упорядочен по дате, он загружается целиком.")
+        return load_budget_transactions(path=path, symbol_table=symbol_table)
+
+    recent_transactions.reverse()
+    return recent_transactions
 
 
 def _sort_transactions_chronologically(transactions):
     """
     Сортирует список транзакций по дате и времени по возрастанию.
-    Использует временный ключ '_sort_key' и heap_sort.
+    Использует временный ключ '_sort_key' и adaptive_sort: список, прочитанный
+    из упорядоченного файла с одной добавленной или изменённой записью,
+    сортируется за линейное время.
     """
     if not transactions:
         return
 
     for transaction in transactions:
-        # Парсим дату
-        parsed = validate_and_parse_date(transaction['date'])
-        if parsed:
-            year, month, day = parsed
-        else:
-            year, month, day = 9999, 99, 99
-
-        # Парсим время
-        try:
-            time_parts = transaction['time'].split(':')
-            hour = int(time_parts[0])
-            minute = int(time_parts[1])
-            if not (0 <= hour <= 23 and 0 <= minute <= 59):
-                raise ValueError
-        except (ValueError, IndexError, AttributeError):
-            hour, minute = 99, 99
+        transaction['_sort_key'] = chronological_sort_key(
+            transaction['date'], transaction['time']
+        )
 
-        transaction['_sort_key'] = (year, month, day, hour, minute)
-
-    heap_sort(transactions, '_sort_key', reverse=False)
+    adaptive_sort(transactions, '_sort_key')
 
     for transaction in transactions:
         del transaction['_sort_key']
 
 
-def save_budget_transactions(transactions):
-    """Сохраняет транзакции в файл в хронологическом порядке."""
-    _sort_transactions_chronologically(transactions)
+def save_budget_transactions(transactions, memory_limit_bytes=None, temp_dir=None,
+                             compression_level=None, path=None):
+    """
+    Сохраняет транзакции в файл в хронологическом порядке.
+    Если задан memory_limit_bytes, сортировка выполняется внешним слиянием
+    через временные файлы в temp_dir, и transactions может быть любым
+    итерируемым объектом (например, генератором).
+    compression_level задаёт уровень сжатия для файлов .gz, .bz2 и .xz.
+    Возвращает True при успехе, False при ошибке (файл остаётся прежним).
+    """
+    path = _ledger_path(path)
     try:
-        with open(BUDGET_DATA_FILE, 'w', encoding='utf-8') as file:
-            for transaction in transactions:
-                record = (
-                    transaction['date'],
-                    transaction['time'],
-                    transaction['direction'],
-                    transaction['category'],
-                    str(transaction['amount']),
-                    transaction['counterparty']
-                )
-                file.write("\t".join(record) + "\n")
-        print(f" Данные успешно сохранены в файл '{BUDGET_DATA_FILE}'.")
+        if memory_limit_bytes is not None:
+            external_sort_lines(
+                (_format_transaction_line(transaction) for transaction in transactions),
+                path,
+                memory_limit_bytes=memory_limit_bytes,
+                temp_dir=temp_dir,
+                compression_level=compression_level,
+            )
+        else:
+            _sort_transactions_chronologically(transactions)
+            with replace_ledger_atomically(path, compression_level) as file:
+                for transaction in transactions:
+                    file.write(_format_transaction_line(transaction))
     except Exception as error:
         print(f" Ошибка при сохранении файла: {error}")
+        return False
+    print(f" Данные успешно сохранены в файл '{path}'.")
+    return True
 
 
-def add_transaction(transaction):
+def compact_budget_file(memory_limit_bytes=DEFAULT_MEMORY_LIMIT_BYTES, temp_dir=None,
+                        compression_level=None, path=None):
     """
-    Добавляет новую транзакцию в базу данных.
-    Принимает словарь с ключами: date, time, direction, category, amount, counterparty.
+    Уплотняет файл данных: отбрасывает строки неверного формата и
+    пересортировывает записи внешним слиянием, не загружая файл в память.
     Возвращает True при успехе, False при ошибке.
     """
-    transactions = load_budget_transactions()
-    if transactions is None:
+    path = _ledger_path(path)
+    try:
+        with exclusive_ledger_lock(path):
+            written_count = external_sort_lines(
+                (_format_transaction_line(transaction)
+                 for transaction in iter_budget_transactions(path=path)),
+                path,
+                memory_limit_bytes=memory_limit_bytes,
+                temp_dir=temp_dir,
+                compression_level=compression_level,
+            )
+    except FileNotFoundError:
+        print(f" Файл '{path}' не найден.")
+        return False
+    except Exception as error:
+        print(f" Ошибка при уплотнении файла: {error}")
         return False
 
-    transactions.append(transaction)
-    save_budget_transactions(transactions)
+    print(f" Файл '{path}' уплотнён: {written_count} записей.")
     return True
 
 
-def delete_transaction(index):
+def _load_for_update(path, expected_version):
+    """
+    Загружает транзакции для изменения (под исключительной блокировкой).
+    Если expected_version задана и файл с тех пор изменился, сообщает
+    о конфликте и возвращает None.
+    """
+    transactions, version = load_budget_snapshot(path=path)
+    if transactions is None:
+        return None
+    if expected_version is not None and version != expected_version:
+        print(" Файл бюджета изменён другим процессом после чтения. "
+              "Загрузите данные заново и повторите изменение.")
+        return None
+    return transactions
+
+
+def add_transaction(transaction, path=None):
+    """
+    Добавляет новую транзакцию в базу данных.
+    Принимает словарь с ключами: date, time, direction, category, amount, counterparty.
+    Возвращает True при успехе, False при ошибке.
+    """
+    path = _ledger_path(path)
+    with exclusive_ledger_lock(path):
+        transactions = _load_for_update(path, None)
+        if transactions is None:
+            return False
+
+        transactions.append(transaction)
+        return save_budget_transactions(transactions, path=path)
+
+
+def delete_transaction(index, path=None, expected_version=None):
     """
     Удаляет транзакцию по индексу (начиная с 0).
+    expected_version — версия снимка из load_budget_snapshot, по которому
+    выбран индекс; если файл с тех пор изменился, удаление отменяется.
     Возвращает True при успехе, False при ошибке.
     """
-    transactions = load_budget_transactions()
-    if transactions is None:
-        return False
+    path = _ledger_path(path)
+    with exclusive_ledger_lock(path):
+        transactions = _load_for_update(path, expected_version)
+        if transactions is None:
+            return False
 
-    if 0 <= index < len(transactions):
-        transactions.pop(index)
-        save_budget_transactions(transactions)
-        return True
+        if 0 <= index < len(transactions):
+            transactions.pop(index)
+            return save_budget_transactions(transactions, path=path)
     return False
 
 
-def update_transaction(index, new_transaction):
+def update_transaction(index, new_transaction, path=None, expected_version=None):
     """
     Обновляет транзакцию по индексу (начиная с 0).
     Принимает новый словарь транзакции.
+    expected_version — версия снимка из load_budget_snapshot, по которому
+    выбран индекс; если файл с тех пор изменился, обновление отменяется.
     Возвращает True при успехе, False при ошибке.
     """
-    transactions = load_budget_transactions()
-    if transactions is None:
-        return False
+    path = _ledger_path(path)
+    with exclusive_ledger_lock(path):
+        transactions = _load_for_update(path, expected_version)
+        if transactions is None:
+            return False
 
-    if 0 <= index < len(transactions):
-        transactions[index] = new_transaction
-        save_budget_transactions(transactions)
-        return True
+        if 0 <= index < len(transactions):
+            transactions[index] = new_transaction
+            return save_budget_transactions(transactions, path=path)
     return False
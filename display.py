@@ -1,10 +1,10 @@
 from data_loader import (
-    load_budget_transactions,
+    load_budget_snapshot,
     add_transaction,
     delete_transaction,
     update_transaction
 )
-from utils import validate_and_parse_date
+from utils import validate_and_parse_date, validate_and_parse_time
 
 
 def display_main_menu():
@@ -66,16 +66,12 @@ def get_transaction_input():
 
     while True:
         time_str = input("Время (ЧЧ:ММ): ").strip()
-        try:
-            hours, minutes = map(int, time_str.split(':'))
-            if 0 <= hours <= 23 and 0 <= minutes <= 59:
-                break
-            print(
-                "  Неверный формат времени. Часы должны быть от 0 до 23, "
-                "минуты от 0 до 59."
-            )
-        except ValueError:
-            print("  Неверный формат времени. Пожалуйста, используйте формат ЧЧ:ММ.")
+        if validate_and_parse_time(time_str) is not None:
+            break
+        print(
+            "  Неверный формат времени. Используйте формат ЧЧ:ММ "
+            "(часы от 0 до 23, минуты от 0 до 59)."
+        )
 
     while True:
         direction = input("Направление (приход/расход): ").strip().lower()
@@ -122,7 +118,7 @@ def add_new_transaction():
 
 def edit_transaction():
     """Редактирует существующую транзакцию."""
-    transactions = load_budget_transactions()
+    transactions, version = load_budget_snapshot()
     if transactions is None:
         print(" Не удалось загрузить данные.")
         return
@@ -160,18 +156,10 @@ def edit_transaction():
         date_str = current_transaction['date']
 
     time_str = input(f"Время ({current_transaction['time']}): ").strip()
-    if time_str:
-        try:
-            hours, minutes = map(int, time_str.split(':'))
-            if 0 <= hours <= 23 and 0 <= minutes <= 59:
-                pass
-            else:
-                print("  Неверный формат времени. Оставляем текущее значение.")
-                time_str = current_transaction['time']
-        except ValueError:
-            print("  Неверный формат времени. Оставляем текущее значение.")
-            time_str = current_transaction['time']
-    else:
+    if time_str and validate_and_parse_time(time_str) is None:
+        print("  Неверный формат времени. Оставляем текущее значение.")
+        time_str = current_transaction['time']
+    elif not time_str:
         time_str = current_transaction['time']
 
     direction = input(f"Направление ({current_transaction['direction']}): ").strip().lower()
@@ -213,7 +201,7 @@ def edit_transaction():
         'counterparty': counterparty
     }
 
-    if update_transaction(user_index - 1, new_transaction):
+    if update_transaction(user_index - 1, new_transaction, expected_version=version):
         print(" Транзакция успешно обновлена.")
     else:
         print(" Ошибка при обновлении транзакции.")
@@ -221,7 +209,7 @@ def edit_transaction():
 
 def delete_selected_transaction():
     """Удаляет выбранную транзакцию."""
-    transactions = load_budget_transactions()
+    transactions, version = load_budget_snapshot()
     if transactions is None:
         print(" Не удалось загрузить данные.")
         return
@@ -244,7 +232,7 @@ def delete_selected_transaction():
 
     confirm = input(f"Вы уверены, что хотите удалить транзакцию №{user_index}? (y/n): ").strip().lower()
     if confirm == 'y':
-        if delete_transaction(user_index - 1):
+        if delete_transaction(user_index - 1, expected_version=version):
             print(" Транзакция успешно удалена.")
         else:
             print(" Ошибка при удалении транзакции.")
@@ -0,0 +1,167 @@
+"""
+Внешняя сортировка слиянием для файлов бюджета, не помещающихся в память.
+
+Строки читаются потоком и собираются в серии ограниченного размера; каждая серия
+сортируется в памяти и записывается во временный файл. Затем серии сливаются
+k-путевым слиянием через кучу, и результат построчно пишется в итоговый файл.
+Порядок совпадает с _sort_transactions_chronologically: записи с невалидной
+датой или временем оказываются в конце.
+"""
+
+import heapq
+import os
+import tempfile
+
+from adaptive_sort import adaptive_sort
+from ledger_io import replace_ledger_atomically
+from utils import chronological_sort_key
+
+DEFAULT_MEMORY_LIMIT_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_MERGE_FAN_IN = 64
+
+# Грубая оценка накладных расходов на одну строку серии в памяти
+# (словарь, кортеж ключа и объект строки) сверх длины самой строки.
+_ROW_OVERHEAD_BYTES = 400
+
+
+def _line_sort_key(line):
+    """Хронологический ключ для строки файла 'дата\\tвремя\\t...'."""
+    parts = line.split('\t', 2)
+    time_str = parts[1] if len(parts) > 1 else ''
+    return chronological_sort_key(parts[0], time_str)
+
+
+def _write_sorted_run(run, temp_dir):
+    """Сортирует серию в памяти и записывает её во временный файл. Возвращает путь."""
+    adaptive_sort(run, '_sort_key')
+    file_descriptor, run_path = tempfile.mkstemp(
+        prefix='budget_run_', suffix='.txt', dir=temp_dir
+    )
+    with os.fdopen(file_descriptor, 'w', encoding='utf-8') as run_file:
+        for entry in run:
+            run_file.write(entry['line'])
+    return run_path
+
+
+def _split_into_sorted_runs(lines, memory_limit_bytes, temp_dir):
+    """Разбивает поток строк на отсортированные серии во временных файлах."""
+    run_paths = []
+    run = []
+    run_size = 0
+    try:
+        for line in lines:
+            if not line.endswith('\n'):
+                line += '\n'
+            run.append({'_sort_key': _line_sort_key(line), 'line': line})
+            run_size += len(line) + _ROW_OVERHEAD_BYTES
+            if run_size >= memory_limit_bytes:
+                run_paths.append(_write_sorted_run(run, temp_dir))
+                run = []
+                run_size = 0
+        if run:
+            run_paths.append(_write_sorted_run(run, temp_dir))
+    except BaseException:
+        _remove_files(run_paths)
+        raise
+    return run_paths
+
+
+def _merge_runs(run_paths, output_file):
+    """
+    Сливает отсортированные серии в output_file через кучу.
+    При равных ключах раньше идёт строка из более ранней серии.
+    Возвращает количество записанных строк.
+    """
+    run_files = []
+    written = 0
+    try:
+        heap = []
+        for run_index, run_path in enumerate(run_paths):
+            run_file = open(run_path, 'r', encoding='utf-8')
+            run_files.append(run_file)
+            line = run_file.readline()
+            if line:
+                heap.append((_line_sort_key(line), run_index, line))
+        heapq.heapify(heap)
+
+        while heap:
+            _, run_index, line = heap[0]
+            output_file.write(line)
+            written += 1
+            next_line = run_files[run_index].readline()
+            if next_line:
+                heapq.heapreplace(heap, (_line_sort_key(next_line), run_index, next_line))
+            else:
+                heapq.heappop(heap)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+    return written
+
+
+def _reduce_runs(run_paths, max_merge_fan_in, temp_dir):
+    """
+    Сливает серии группами, пока их не станет не больше max_merge_fan_in.
+    Ограничивает число одновременно открытых временных файлов.
+    """
+    while len(run_paths) > max_merge_fan_in:
+        merged_paths = []
+        try:
+            for group_start in range(0, len(run_paths), max_merge_fan_in):
+                group = run_paths[group_start:group_start + max_merge_fan_in]
+                file_descriptor, merged_path = tempfile.mkstemp(
+                    prefix='budget_run_', suffix='.txt', dir=temp_dir
+                )
+                merged_paths.append(merged_path)
+                with os.fdopen(file_descriptor, 'w', encoding='utf-8') as merged_file:
+                    _merge_runs(group, merged_file)
+                _remove_files(group)
+        except BaseException:
+            _remove_files(run_paths + merged_paths)
+            raise
+        run_paths = merged_paths
+    return run_paths
+
+
+def _remove_files(paths):
+    """Удаляет временные файлы, игнорируя уже удалённые."""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def external_sort_lines(lines, output_path,
+                        memory_limit_bytes=DEFAULT_MEMORY_LIMIT_BYTES,
+                        temp_dir=None,
+                        max_merge_fan_in=DEFAULT_MAX_MERGE_FAN_IN,
+                        compression_level=None):
+    """
+    Сортирует поток строк файла бюджета в хронологическом порядке и записывает
+    результат в output_path.
+
+    memory_limit_bytes — примерный объём памяти на одну серию;
+    temp_dir — каталог для временных серий (по умолчанию системный);
+    max_merge_fan_in — сколько серий сливается за один проход;
+    compression_level — уровень сжатия, если output_path оканчивается на
+    .gz, .bz2 или .xz.
+
+    Итоговый файл сначала пишется рядом с output_path и затем атомарно
+    подменяет его, поэтому output_path может совпадать с источником строк.
+    Возвращает количество записанных строк.
+    """
+    if memory_limit_bytes <= 0:
+        raise ValueError("memory_limit_bytes должно быть положительным числом.")
+    if max_merge_fan_in < 2:
+        raise ValueError("max_merge_fan_in должно быть не меньше 2.")
+
+    run_paths = _split_into_sorted_runs(lines, memory_limit_bytes, temp_dir)
+    run_paths = _reduce_runs(run_paths, max_merge_fan_in, temp_dir)
+
+    try:
+        with replace_ledger_atomically(output_path, compression_level) as output_file:
+            written = _merge_runs(run_paths, output_file)
+    finally:
+        _remove_files(run_paths)
+    return written
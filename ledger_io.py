@@ -0,0 +1,130 @@
+"""
+Открытие файлов бюджета с прозрачным сжатием.
+
+При чтении формат (.gz, .bz2, .xz или обычный текст) определяется по
+сигнатуре в начале файла, а распаковка идёт потоково крупными блоками.
+При записи формат выбирается по расширению пути. Файл бюджета
+перезаписывается атомарно (replace_ledger_atomically): читатели видят либо
+старую, либо новую версию целиком.
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+READ_BUFFER_SIZE = 1024 * 1024
+DEFAULT_COMPRESSION_LEVEL = 6
+
+_MAGIC_BYTES = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+)
+
+_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+}
+
+
+def detect_compression(path):
+    """
+    Определяет формат сжатия по сигнатуре файла.
+    Возвращает 'gzip', 'bz2', 'xz' или None для обычного текста.
+    """
+    with open(path, 'rb') as file:
+        header = file.read(6)
+    for magic, compression in _MAGIC_BYTES:
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def compression_for_path(path):
+    """Определяет формат сжатия по расширению пути. Возвращает имя формата или None."""
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def open_ledger_for_reading(path):
+    """Открывает файл бюджета для чтения текста, распаковывая его при необходимости."""
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, 'r', encoding='utf-8', buffering=READ_BUFFER_SIZE)
+
+    if compression == 'gzip':
+        compressed_file = gzip.open(path, 'rb')
+    elif compression == 'bz2':
+        compressed_file = bz2.open(path, 'rb')
+    else:
+        compressed_file = lzma.open(path, 'rb')
+    buffered_file = io.BufferedReader(compressed_file, buffer_size=READ_BUFFER_SIZE)
+    return io.TextIOWrapper(buffered_file, encoding='utf-8')
+
+
+def open_ledger_for_writing(path, compression_level=None, compression=None):
+    """
+    Открывает файл бюджета для записи текста.
+    Формат берётся из compression, а если он не задан — из расширения path.
+    compression_level — уровень сжатия (1–9), по умолчанию DEFAULT_COMPRESSION_LEVEL.
+    """
+    if compression is None:
+        compression = compression_for_path(path)
+    if compression_level is None:
+        compression_level = DEFAULT_COMPRESSION_LEVEL
+
+    if compression is None:
+        return open(path, 'w', encoding='utf-8')
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', compresslevel=compression_level, encoding='utf-8')
+    if compression == 'bz2':
+        return bz2.open(path, 'wt', compresslevel=compression_level, encoding='utf-8')
+    if compression == 'xz':
+        return lzma.open(path, 'wt', preset=compression_level, encoding='utf-8')
+    raise ValueError(f"Неизвестный формат сжатия: {compression}")
+
+
+def _copy_permissions(source_path, target_path):
+    """
+    Переносит права доступа source_path на target_path.
+    Временный файл mkstemp доступен только владельцу, а подменяемый
+    файл бюджета должен сохранить свои права.
+    """
+    try:
+        shutil.copymode(source_path, target_path)
+    except FileNotFoundError:
+        os.chmod(target_path, 0o644)
+
+
+@contextmanager
+def replace_ledger_atomically(path, compression_level=None):
+    """
+    Открывает временный файл рядом с path для записи бюджета.
+    После успешной записи файл сбрасывается на диск и атомарно подменяет path;
+    при ошибке временный файл удаляется, а path остаётся прежним.
+    """
+    file_descriptor, partial_path = tempfile.mkstemp(
+        prefix='.budget_', suffix='.tmp', dir=os.path.dirname(os.path.abspath(path))
+    )
+    os.close(file_descriptor)
+    try:
+        with open_ledger_for_writing(
+                partial_path,
+                compression_level=compression_level,
+                compression=compression_for_path(path)) as file:
+            yield file
+        with open(partial_path, 'rb') as written_file:
+            os.fsync(written_file.fileno())
+        _copy_permissions(path, partial_path)
+        os.replace(partial_path, path)
+    except BaseException:
+        try:
+            os.remove(partial_path)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,62 @@
+"""
+Согласование доступа нескольких процессов к одному файлу бюджета.
+
+Запись идёт только через атомарную подмену файла (ledger_io.replace_ledger_atomically),
+поэтому читатель, открывший файл, дочитывает свой снимок до конца, даже если
+в это время другой процесс записывает новую версию: читателям блокировки
+не нужны. Версия снимка — это идентичность открытого файла (inode, размер,
+время изменения): каждая запись создаёт новый файл и тем самым новую версию,
+а дописывание строк сторонней программой меняет размер и время.
+
+Процессы, изменяющие бюджет (чтение — изменение — запись), держат
+исключительную блокировку fcntl на файле path + '.lock' и перед записью
+сверяют версию, на основе которой пользователь выбирал изменения
+(оптимистическая проверка). Разделяемая блокировка нужна тем, кому важно,
+чтобы файл не менялся, пока они работают (например, резервному копированию).
+На платформах без fcntl блокировки не действуют.
+"""
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOCK_FILE_SUFFIX = '.lock'
+
+
+@contextmanager
+def _ledger_lock(path, operation):
+    """Удерживает блокировку fcntl на файле блокировки бюджета path."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + LOCK_FILE_SUFFIX, 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def exclusive_ledger_lock(path):
+    """
+    Исключительная блокировка бюджета для изменения.
+    Внутри неё нельзя снова брать блокировку того же бюджета:
+    flock на новом дескрипторе будет ждать самого себя.
+    """
+    return _ledger_lock(path, fcntl.LOCK_EX if fcntl else None)
+
+
+def shared_ledger_lock(path):
+    """Разделяемая блокировка: не даёт изменять бюджет, пока она удерживается."""
+    return _ledger_lock(path, fcntl.LOCK_SH if fcntl else None)
+
+
+def file_version(file):
+    """Версия снимка бюджета по открытому файлу."""
+    file_stat = os.fstat(file.fileno())
+    return (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+
@@ -0,0 +1,210 @@
+"""
+Слежение за файлом бюджета, в который дописывают строки другие программы.
+
+Состояние слежения — словарь, который создаёт start_watching. Он помнит,
+до какого байта файл уже разобран, inode, размер, время изменения и
+контрольные суммы начала файла и байтов перед разобранной границей.
+refresh_watched_ledger по этим данным отличает дописывание от перезаписи:
+при дописывании разбирается только новый хвост, при перезаписи (в том числе
+атомарной подмене файла этой программой, которая меняет inode) файл
+загружается заново. Сжатые файлы дописывать нельзя, поэтому любое их
+изменение приводит к полной загрузке.
+"""
+
+import os
+import zlib
+
+import data_loader
+from data_loader import load_budget_transactions, parse_transaction_line
+from ledger_io import detect_compression
+
+HEAD_CHECKSUM_BYTES = 4096
+BOUNDARY_CHECKSUM_BYTES = 4096
+
+
+def start_watching(listeners=None, path=None):
+    """
+    Загружает бюджет из path (по умолчанию BUDGET_DATA_FILE) и возвращает
+    состояние слежения.
+    listeners — функции listener(rows, reloaded), которые получают новые строки;
+    reloaded=True означает, что rows — весь бюджет после полной загрузки.
+    Возвращает None, если бюджет не удалось загрузить.
+    """
+    watch_state = {
+        'path': data_loader.BUDGET_DATA_FILE if path is None else path,
+        'transactions': [],
+        'symbol_table': {},
+        'listeners': list(listeners or []),
+        'offset': 0,
+        'line_count': 0,
+        'inode': None,
+        'size': 0,
+        'mtime': None,
+        'head_length': 0,
+        'head_checksum': 0,
+        'boundary_length': 0,
+        'boundary_checksum': 0,
+        'compression': None,
+    }
+    if _reload(watch_state) is None:
+        return None
+    return watch_state
+
+
+def add_ledger_listener(watch_state, listener):
+    """Подписывает listener(rows, reloaded) на изменения бюджета."""
+    watch_state['listeners'].append(listener)
+
+
+def refresh_watched_ledger(watch_state):
+    """
+    Приводит список транзакций в состоянии в соответствие с файлом.
+    Возвращает актуальный список транзакций или None при ошибке.
+    """
+    try:
+        file_stat = os.stat(watch_state['path'])
+    except FileNotFoundError:
+        return _reload(watch_state)
+    except OSError as error:
+        print(f" Ошибка при чтении файла: {error}")
+        return None
+
+    unchanged = (
+        file_stat.st_size == watch_state['size']
+        and file_stat.st_mtime_ns == watch_state['mtime']
+    )
+    if unchanged:
+        return watch_state['transactions']
+
+    if (watch_state['compression'] is not None
+            or file_stat.st_ino != watch_state['inode']
+            or file_stat.st_size <= watch_state['size']):
+        return _reload(watch_state)
+
+    try:
+        appended = _read_appended_tail(watch_state)
+    except (OSError, UnicodeDecodeError) as error:
+        print(f" Ошибка при чтении файла: {error}")
+        return None
+    if appended is None:
+        return _reload(watch_state)
+    if appended:
+        _notify(watch_state, appended, False)
+    return watch_state['transactions']
+
+
+def _notify(watch_state, rows, reloaded):
+    """Передаёт строки всем подписчикам."""
+    for listener in watch_state['listeners']:
+        listener(rows, reloaded)
+
+
+def _reload(watch_state):
+    """Полностью перечитывает бюджет. Возвращает список транзакций или None."""
+    if not os.path.exists(watch_state['path']):
+        print(f" Файл '{watch_state['path']}' не найден.")
+        data_loader.create_sample_budget_data(watch_state['path'])
+    try:
+        compression = detect_compression(watch_state['path'])
+    except OSError as error:
+        print(f" Ошибка при чтении файла: {error}")
+        return None
+
+    watch_state['symbol_table'] = {}
+    watch_state['transactions'] = []
+    watch_state['offset'] = 0
+    watch_state['line_count'] = 0
+    watch_state['inode'] = None
+    watch_state['head_length'] = 0
+    watch_state['head_checksum'] = 0
+    watch_state['boundary_length'] = 0
+    watch_state['boundary_checksum'] = 0
+    watch_state['compression'] = compression
+
+    if compression is not None:
+        transactions = load_budget_transactions(
+            path=watch_state['path'], symbol_table=watch_state['symbol_table']
+        )
+        if transactions is None:
+            return None
+        watch_state['transactions'] = transactions
+        _remember_file_stat(watch_state)
+    else:
+        try:
+            if _read_appended_tail(watch_state) is None:
+                return None
+        except (OSError, UnicodeDecodeError) as error:
+            print(f" Ошибка при чтении файла: {error}")
+            return None
+
+    _notify(watch_state, watch_state['transactions'], True)
+    return watch_state['transactions']
+
+
+def _remember_file_stat(watch_state):
+    """Запоминает inode, размер и время изменения файла."""
+    file_stat = os.stat(watch_state['path'])
+    watch_state['inode'] = file_stat.st_ino
+    watch_state['size'] = file_stat.st_size
+    watch_state['mtime'] = file_stat.st_mtime_ns
+
+
+def _read_appended_tail(watch_state):
+    """
+    Разбирает строки, дописанные после watch_state['offset'].
+    Незавершённая последняя строка (без перевода строки) остаётся на потом.
+    Возвращает список новых транзакций или None, если файл подменён или
+    уже разобранная часть изменилась и нужна полная загрузка.
+    """
+    offset = watch_state['offset']
+    with open(watch_state['path'], 'rb') as file:
+        file_stat = os.fstat(file.fileno())
+        if offset:
+            if file_stat.st_ino != watch_state['inode']:
+                return None
+            file.seek(0)
+            head = file.read(watch_state['head_length'])
+            if zlib.crc32(head) != watch_state['head_checksum']:
+                return None
+            # Вставка записи в середину файла сдвигает хвост: байты перед
+            # границей разбора (они кончаются переводом строки) уже не те.
+            file.seek(offset - watch_state['boundary_length'])
+            boundary = file.read(watch_state['boundary_length'])
+            if zlib.crc32(boundary) != watch_state['boundary_checksum']:
+                return None
+        file.seek(offset)
+        tail = file.read()
+
+        complete_length = tail.rfind(b'\n') + 1
+        new_rows = []
+        symbol_table = watch_state['symbol_table']
+        line_number = watch_state['line_count']
+        for raw_line in tail[:complete_length].split(b'\n')[:-1]:
+            line_number += 1
+            transaction_record = parse_transaction_line(
+                raw_line.decode('utf-8'), line_number, symbol_table
+            )
+            if transaction_record is not None:
+                new_rows.append(transaction_record)
+
+        offset += complete_length
+        if watch_state['head_length'] < HEAD_CHECKSUM_BYTES:
+            file.seek(0)
+            head = file.read(min(offset, HEAD_CHECKSUM_BYTES))
+            watch_state['head_length'] = len(head)
+            watch_state['head_checksum'] = zlib.crc32(head)
+        boundary_length = min(offset, BOUNDARY_CHECKSUM_BYTES)
+        file.seek(offset - boundary_length)
+        boundary = file.read(boundary_length)
+        watch_state['boundary_length'] = len(boundary)
+        watch_state['boundary_checksum'] = zlib.crc32(boundary)
+
+    # Размер запоминается по разобранной части: если в конце осталась
+    # незавершённая строка, следующая проверка прочитает её снова.
+    watch_state['offset'] = offset
+    watch_state['line_count'] = line_number
+    watch_state['inode'] = file_stat.st_ino
+    watch_state['size'] = offset
+    watch_state['mtime'] = file_stat.st_mtime_ns
+    watch_state['transactions'].extend(new_rows)
+    return new_rows
@@ -8,8 +8,10 @@ from display import (
 )
 from data_loader import (
     load_budget_transactions,
+    load_recent_budget_transactions,
     create_sample_budget_data
 )
+from ledger_watch import start_watching, refresh_watched_ledger
 from reports import (
     generate_income_report_last_n_days,
     generate_expense_report_by_category,
@@ -55,23 +57,43 @@ def get_valid_time(prompt: str) -> str:
         print(" Неверный формат времени. Используйте ЧЧ:ММ (например, 18:30).")
 
 
+def load_current_transactions(watch_state):
+    """
+    Возвращает актуальные транзакции и таблицу символов, через которую они
+    загружены: дописанные в файл строки дочитываются, а при перезаписи файла
+    он загружается заново.
+    """
+    if watch_state is None:
+        symbol_table = {}
+        return load_budget_transactions(symbol_table=symbol_table), symbol_table
+    transactions = refresh_watched_ledger(watch_state)
+    return transactions, watch_state['symbol_table']
+
+
 def handle_income_report():
     days_input = get_valid_n_days()
-    transactions = load_budget_transactions()
+    # Для отчёта за последние дни достаточно прочитать хвост файла
+    # (в том числе при слежении: он читается с диска и потому актуален)
+    symbol_table = {}
+    transactions = load_recent_budget_transactions(days_input, symbol_table=symbol_table)
     if transactions is not None:
-        generate_income_report_last_n_days(transactions, days_input)
+        generate_income_report_last_n_days(
+            transactions, days_input, symbol_table=symbol_table
+        )
         wait_for_user_to_return()
 
 
-def handle_expense_report_by_category():
+def handle_expense_report_by_category(watch_state):
     category = get_non_empty_category()
-    transactions = load_budget_transactions()
+    transactions, symbol_table = load_current_transactions(watch_state)
     if transactions is not None:
-        generate_expense_report_by_category(transactions, category)
+        generate_expense_report_by_category(
+            transactions, category, symbol_table=symbol_table
+        )
         wait_for_user_to_return()
 
 
-def handle_expense_report_in_time_interval():
+def handle_expense_report_in_time_interval(watch_state):
     start_time = get_valid_time("Начало интервала (ЧЧ:ММ, например 18:00): ")
     end_time = get_valid_time("Конец интервала (ЧЧ:ММ, например 21:00): ")
 
@@ -79,22 +101,25 @@ def handle_expense_report_in_time_interval():
     if start_time > end_time:
         print(" Начало интервала позже конца. Отчёт может быть пустым.")
 
-    transactions = load_budget_transactions()
+    transactions, symbol_table = load_current_transactions(watch_state)
     if transactions is not None:
-        generate_expense_report_in_time_interval(transactions, start_time, end_time)
+        generate_expense_report_in_time_interval(
+            transactions, start_time, end_time, symbol_table=symbol_table
+        )
         wait_for_user_to_return()
 
 
 def main():
     print("Добро пожаловать в программу 'Персональный бюджет'")
     create_sample_budget_data()
+    watch_state = start_watching()
 
     while True:
         display_main_menu()
         user_choice = input("Выберите действие (1-8): ").strip()
 
         if user_choice == "1":
-            transactions = load_budget_transactions()
+            transactions, _ = load_current_transactions(watch_state)
             if transactions is None:
                 print(" Не удалось загрузить данные.")
             else:
@@ -115,10 +140,10 @@ def main():
             handle_income_report()
 
         elif user_choice == "6":
-            handle_expense_report_by_category()
+            handle_expense_report_by_category(watch_state)
 
         elif user_choice == "7":
-            handle_expense_report_in_time_interval()
+            handle_expense_report_in_time_interval(watch_state)
 
         elif user_choice == "8":
             print(" До свидания! Бюджет сохранён.")
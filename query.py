@@ -0,0 +1,165 @@
+"""
+Модуль декларативных запросов к транзакциям.
+
+Запрос — словарь вида {'filter': {...}, 'sort': 'имя_сортировки'}.
+Фильтр может содержать ключи:
+    'direction'  — направление ('приход' / 'расход');
+    'category'   — категория (точное совпадение);
+    'date_from'  — начальная дата 'ГГГГ-ММ-ДД' (включительно);
+    'date_to'    — конечная дата 'ГГГГ-ММ-ДД' (включительно);
+    'time_from'  — начало интервала времени 'ЧЧ:ММ' (включительно);
+    'time_to'    — конец интервала времени 'ЧЧ:ММ' (включительно).
+Отсутствующий ключ означает «без ограничения».
+
+run_queries выполняет любое количество запросов за один проход по данным:
+каждая транзакция попадает в результат каждого подходящего запроса.
+Если передать таблицу символов бюджета (см. data_loader.intern_symbol),
+значения 'direction' и 'category' заменяются её экземплярами, и сравнение
+с полями транзакций сводится к проверке идентичности объектов.
+"""
+
+from heap_sort import heap_sort
+from utils import is_time_in_range, validate_and_parse_date
+
+INTERNED_FILTER_FIELDS = ('direction', 'category')
+
+
+def make_query(sort=None, **filter_spec):
+    """Создаёт запрос из сортировки и условий фильтра."""
+    if sort is not None and sort not in SORT_KEY_BUILDERS:
+        raise ValueError(f"Неизвестная сортировка: {sort}")
+    return {'filter': filter_spec, 'sort': sort}
+
+
+def _intern_filter_values(filter_spec, symbol_table):
+    """
+    Возвращает фильтр, в котором значения точного совпадения взяты из таблицы
+    символов бюджета. Значения, которых в бюджете нет, остаются как есть:
+    с ними не совпадёт ни одна транзакция. Таблица не пополняется.
+    """
+    interned = dict(filter_spec)
+    for field in INTERNED_FILTER_FIELDS:
+        if field in interned:
+            interned[field] = symbol_table.get(interned[field], interned[field])
+    return interned
+
+
+def transaction_matches(filter_spec, transaction):
+    """Проверяет, удовлетворяет ли транзакция всем условиям фильтра."""
+    if 'direction' in filter_spec and transaction.get('direction') != filter_spec['direction']:
+        return False
+    if 'category' in filter_spec and transaction.get('category') != filter_spec['category']:
+        return False
+
+    if 'date_from' in filter_spec or 'date_to' in filter_spec:
+        date_val = transaction.get('date')
+        if not isinstance(date_val, str):
+            return False
+        if 'date_from' in filter_spec and date_val < filter_spec['date_from']:
+            return False
+        if 'date_to' in filter_spec and date_val > filter_spec['date_to']:
+            return False
+
+    if 'time_from' in filter_spec or 'time_to' in filter_spec:
+        start_time = filter_spec.get('time_from', '00:00')
+        end_time = filter_spec.get('time_to', '23:59')
+        if not is_time_in_range(transaction.get('time'), start_time, end_time):
+            return False
+
+    return True
+
+
+def _parsed_date_or_last(transaction):
+    """Возвращает (-год, -месяц, -день) или (9999, 99, 99) для невалидной даты."""
+    parsed = validate_and_parse_date(transaction['date'])
+    if parsed:
+        year, month, day = parsed
+        return (-year, -month, -day)
+    # На случай невалидной даты — ставим в конец
+    return (9999, 99, 99)
+
+
+def _date_desc_amount_desc_key(transaction):
+    """Дата (по убыванию), сумма (по убыванию)."""
+    return _parsed_date_or_last(transaction) + (-transaction['amount'],)
+
+
+def _date_desc_counterparty_amount_desc_key(transaction):
+    """Дата (по убыванию), контрагент (по возрастанию), сумма (по убыванию)."""
+    return _parsed_date_or_last(transaction) + (
+        transaction['counterparty'],
+        -transaction['amount'],
+    )
+
+
+def _amount_desc_counterparty_key(transaction):
+    """Сумма (по убыванию), контрагент (по возрастанию)."""
+    return (-transaction['amount'], transaction['counterparty'])
+
+
+SORT_KEY_BUILDERS = {
+    'date_desc_amount_desc': _date_desc_amount_desc_key,
+    'date_desc_counterparty_amount_desc': _date_desc_counterparty_amount_desc_key,
+    'amount_desc_counterparty': _amount_desc_counterparty_key,
+}
+
+
+def sort_query_result(result, sort_name):
+    """
+    Сортирует результат запроса по имени сортировки с помощью heap_sort.
+    Сами транзакции не изменяются: ключ хранится в обёртке, поэтому одна и та же
+    транзакция может безопасно входить в результаты нескольких запросов.
+    """
+    if sort_name is None or not result:
+        return result
+
+    build_key = SORT_KEY_BUILDERS[sort_name]
+    wrapped = [
+        {'_sort_key': build_key(transaction), 'transaction': transaction}
+        for transaction in result
+    ]
+    heap_sort(wrapped, '_sort_key', reverse=False)
+    return [entry['transaction'] for entry in wrapped]
+
+
+def run_queries(transactions, queries, symbol_table=None):
+    """
+    Выполняет все запросы за один проход по транзакциям.
+    symbol_table — таблица символов, через которую загружены transactions.
+    Возвращает список результатов (списков транзакций) в порядке запросов.
+    """
+    if symbol_table is not None:
+        queries = [
+            dict(query, filter=_intern_filter_values(query['filter'], symbol_table))
+            for query in queries
+        ]
+    results = [[] for _ in queries]
+
+    # Запросы с фильтром по категории раскладываем по категориям, чтобы
+    # для каждой транзакции проверять только запросы её категории.
+    queries_by_category = {}
+    general_queries = []
+    for query_index, query in enumerate(queries):
+        filter_spec = query['filter']
+        if 'category' in filter_spec:
+            queries_by_category.setdefault(filter_spec['category'], []).append(query_index)
+        else:
+            general_queries.append(query_index)
+
+    for transaction in transactions:
+        for query_index in general_queries:
+            if transaction_matches(queries[query_index]['filter'], transaction):
+                results[query_index].append(transaction)
+        for query_index in queries_by_category.get(transaction.get('category'), ()):
+            if transaction_matches(queries[query_index]['filter'], transaction):
+                results[query_index].append(transaction)
+
+    return [
+        sort_query_result(result, query.get('sort'))
+        for result, query in zip(results, queries)
+    ]
+
+
+def run_query(transactions, query, symbol_table=None):
+    """Выполняет один запрос. Возвращает отсортированный список транзакций."""
+    return run_queries(transactions, [query], symbol_table)[0]
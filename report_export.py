@@ -0,0 +1,116 @@
+"""
+Выгрузка строк отчётов в файлы CSV, TSV и JSON Lines.
+
+Приёмник (sink) — словарь, который создаёт open_report_sink. Строки пишутся
+в него по одной через write_report_row и накапливаются в буфере, который
+сбрасывается в файл каждые buffer_rows строк. Первая строка сбрасывается
+сразу, чтобы потребитель увидел её как можно раньше. При заданном row_limit
+лишние строки не записываются, а write_report_row возвращает False.
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+
+EXPORT_FIELDS = ('date', 'time', 'direction', 'category', 'amount', 'counterparty')
+DEFAULT_BUFFER_ROWS = 1000
+
+_FORMATS_BY_EXTENSION = {
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.jsonl': 'jsonl',
+}
+
+
+def open_report_sink(path, export_format=None, row_limit=None,
+                     buffer_rows=DEFAULT_BUFFER_ROWS, fields=EXPORT_FIELDS):
+    """
+    Открывает приёмник строк отчёта.
+    path — путь к файлу или '-' для стандартного вывода;
+    export_format — 'csv', 'tsv' или 'jsonl' (по умолчанию по расширению path);
+    row_limit — наибольшее число строк (None — без ограничения);
+    fields — выгружаемые поля транзакции.
+    """
+    if export_format is None:
+        export_format = _FORMATS_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+    if export_format not in ('csv', 'tsv', 'jsonl'):
+        raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+
+    if path == '-':
+        file = sys.stdout
+    else:
+        file = open(path, 'w', encoding='utf-8', newline='')
+
+    buffer = io.StringIO()
+    writer = None
+    if export_format != 'jsonl':
+        delimiter = '\t' if export_format == 'tsv' else ','
+        writer = csv.writer(buffer, delimiter=delimiter, lineterminator='\n')
+        writer.writerow(fields)
+
+    return {
+        'file': file,
+        'format': export_format,
+        'fields': tuple(fields),
+        'row_limit': row_limit,
+        'rows_written': 0,
+        'buffer': buffer,
+        'buffered_rows': 0,
+        'buffer_rows': buffer_rows,
+        'writer': writer,
+    }
+
+
+def sink_is_full(sink):
+    """Проверяет, достигнут ли предел строк приёмника."""
+    return sink['row_limit'] is not None and sink['rows_written'] >= sink['row_limit']
+
+
+def write_report_row(sink, transaction):
+    """
+    Записывает транзакцию в приёмник.
+    Возвращает False, если предел строк уже достигнут и строка не записана.
+    """
+    if sink_is_full(sink):
+        return False
+
+    values = [transaction.get(field) for field in sink['fields']]
+    if sink['writer'] is None:
+        sink['buffer'].write(
+            json.dumps(dict(zip(sink['fields'], values)), ensure_ascii=False) + "\n"
+        )
+    else:
+        sink['writer'].writerow(values)
+
+    sink['rows_written'] += 1
+    sink['buffered_rows'] += 1
+    if sink['rows_written'] == 1 or sink['buffered_rows'] >= sink['buffer_rows']:
+        flush_report_sink(sink)
+    return True
+
+
+def write_report_rows(sink, transactions):
+    """Записывает транзакции по порядку, пока не будет достигнут предел строк."""
+    for transaction in transactions:
+        if not write_report_row(sink, transaction):
+            break
+
+
+def flush_report_sink(sink):
+    """Сбрасывает накопленные строки в файл."""
+    buffer = sink['buffer']
+    if buffer.tell():
+        sink['file'].write(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate()
+    sink['file'].flush()
+    sink['buffered_rows'] = 0
+
+
+def close_report_sink(sink):
+    """Сбрасывает остаток буфера и закрывает файл (стандартный вывод не закрывается)."""
+    flush_report_sink(sink)
+    if sink['file'] is not sys.stdout:
+        sink['file'].close()
@@ -1,68 +1,74 @@
-from heap_sort import heap_sort
+import sys
+
+from data_loader import (
+    BUDGET_DATA_FILE,
+    iter_budget_transactions_reversed,
+    load_budget_transactions,
+)
+from query import make_query, run_queries, run_query, sort_query_result, transaction_matches
+from report_export import sink_is_full, write_report_rows
 from utils import (
-    is_time_in_range,
-    validate_and_parse_date,
     subtract_days_from_date,
     get_valid_latest_date,
+    validate_and_parse_date,
+    validate_and_parse_time,
 )
 
 
-def generate_income_report_last_n_days(transactions, number_of_days):
+def _message_file(sink):
+    """
+    Поток для сообщений отчёта: при выгрузке в приёмник — stderr, чтобы
+    сообщения не смешивались со строками (приёмник может писать в stdout).
+    """
+    return sys.stderr if sink is not None else None
+
+
+def generate_income_report_last_n_days(transactions, number_of_days, sink=None,
+                                       ledger_is_sorted=False, symbol_table=None):
     """
     Отчёт 1: Поступления за последние N дней (включительно).
     Сортировка: дата (по убыванию), сумма (по убыванию).
+    Если передан sink (см. report_export), строки выгружаются в него.
+    Если к тому же transactions упорядочены хронологически (как в файле),
+    список читается с конца и строки выгружаются по мере чтения.
+    symbol_table — таблица символов бюджета (см. query.run_queries).
     """
     if not isinstance(number_of_days, int) or number_of_days < 0:
-        print("  Ошибка: N должно быть целым неотрицательным числом.")
+        print("  Ошибка: N должно быть целым неотрицательным числом.", file=_message_file(sink))
         return
 
     if not transactions:
-        print("  Нет данных для анализа.")
+        print("  Нет данных для анализа.", file=_message_file(sink))
+        return
+
+    if sink is not None and ledger_is_sorted:
+        stream_income_report(reversed(transactions), number_of_days, sink)
         return
 
     today = get_valid_latest_date(transactions)
     if today is None:
-        print("  Не удалось определить текущую дату: нет валидных записей.")
+        print("  Не удалось определить текущую дату: нет валидных записей.",
+              file=_message_file(sink))
         return
 
     start_date = subtract_days_from_date(today, number_of_days)
     if start_date is None:
-        print("  Ошибка при вычислении начальной даты.")
+        print("  Ошибка при вычислении начальной даты.", file=_message_file(sink))
         return
 
-    filtered = [
-        transaction
-        for transaction in transactions
-        if (
-            transaction.get('direction') == 'приход'
-            and isinstance(transaction.get('date'), str)
-            and transaction['date'] >= start_date
-        )
-    ]
+    filtered = run_query(transactions, income_query(start_date), symbol_table)
 
     if not filtered:
         print(
             f" Нет поступлений за последние {number_of_days} дн. "
-            f"(с {start_date} по {today})."
+            f"(с {start_date} по {today}).",
+            file=_message_file(sink),
         )
         return
 
-    # Создаём составной ключ: (-год, -месяц, -день, -сумма)
-    # reverse=False → даёт: дата по убыванию, сумма по убыванию
-    for transaction in filtered:
-        parsed = validate_and_parse_date(transaction['date'])
-        if parsed:
-            year, month, day = parsed
-            transaction['_sort_key'] = (-year, -month, -day, -transaction['amount'])
-        else:
-            # На случай невалидной даты — ставим в конец
-            transaction['_sort_key'] = (9999, 99, 99, -transaction['amount'])
-
-    heap_sort(filtered, '_sort_key', reverse=False)
-
-    # Удаляем временный ключ
-    for transaction in filtered:
-        del transaction['_sort_key']
+    if sink is not None:
+        write_report_rows(sink, filtered)
+        return
 
     print(
         f"\n Отчёт 1: Поступления за последние {number_of_days} дн. "
@@ -78,41 +84,25 @@ def generate_income_report_last_n_days(transactions, number_of_days):
         )
 
 
-def generate_expense_report_by_category(transactions, category_name):
+def generate_expense_report_by_category(transactions, category_name, sink=None,
+                                        symbol_table=None):
     """
     Отчёт 2: Затраты по категории.
     Сортировка: дата (по убыванию), контрагент (по возрастанию), сумма (по убыванию).
+    Если передан sink (см. report_export), строки выгружаются в него.
+    symbol_table — таблица символов бюджета (см. query.run_queries).
     """
-    expense_transactions = [
-        transaction
-        for transaction in transactions
-        if (
-            transaction['direction'] == 'расход'
-            and transaction['category'] == category_name
-        )
-    ]
+    expense_transactions = run_query(
+        transactions, category_expense_query(category_name), symbol_table
+    )
 
     if not expense_transactions:
-        print(f" Нет затрат по категории '{category_name}'.")
+        print(f" Нет затрат по категории '{category_name}'.", file=_message_file(sink))
         return
 
-    # Составной ключ: (-год, -месяц, -день, контрагент, -сумма)
-    # reverse=False → 
-    #   дата: по убыванию (благодаря -год и т.д.)
-    #   контрагент: по возрастанию (обычный порядок строк)
-    #   сумма: по убыванию (благодаря -сумма)
-    for transaction in expense_transactions:
-        parsed = validate_and_parse_date(transaction['date'])
-        if parsed:
-            year, month, day = parsed
-            transaction['_sort_key'] = (-year, -month, -day, transaction['counterparty'], -transaction['amount'])
-        else:
-            transaction['_sort_key'] = (9999, 99, 99, transaction['counterparty'], -transaction['amount'])
-
-    heap_sort(expense_transactions, '_sort_key', reverse=False)
-
-    for transaction in expense_transactions:
-        del transaction['_sort_key']
+    if sink is not None:
+        write_report_rows(sink, expense_transactions)
+        return
 
     print(
         f"\n Отчёт 2: Затраты по категории '{category_name}' "
@@ -126,37 +116,25 @@ def generate_expense_report_by_category(transactions, category_name):
         )
 
 
-def generate_expense_report_in_time_interval(transactions, start_time, end_time):
+def generate_expense_report_in_time_interval(transactions, start_time, end_time, sink=None,
+                                             symbol_table=None):
     """
     Отчёт 3: Затраты в интервале времени.
     Сортировка: сумма (по убыванию), контрагент (по возрастанию).
+    Если передан sink (см. report_export), строки выгружаются в него.
+    symbol_table — таблица символов бюджета (см. query.run_queries).
     """
-    expense_transactions = [
-        transaction
-        for transaction in transactions
-        if transaction['direction'] == 'расход'
-    ]
-    filtered_transactions = [
-        transaction
-        for transaction in expense_transactions
-        if is_time_in_range(transaction['time'], start_time, end_time)
-    ]
+    filtered_transactions = run_query(
+        transactions, interval_expense_query(start_time, end_time), symbol_table
+    )
 
     if not filtered_transactions:
-        print(f" Нет затрат в интервале {start_time}–{end_time}.")
+        print(f" Нет затрат в интервале {start_time}–{end_time}.", file=_message_file(sink))
         return
 
-    # Составной ключ: (-сумма, контрагент)
-    # reverse=False → 
-    #   -сумма: меньшие значения (более отрицательные) идут первыми → большие суммы первыми
-    #   контрагент: по возрастанию
-    for transaction in filtered_transactions:
-        transaction['_sort_key'] = (-transaction['amount'], transaction['counterparty'])
-
-    heap_sort(filtered_transactions, '_sort_key', reverse=False)
-
-    for transaction in filtered_transactions:
-        del transaction['_sort_key']
+    if sink is not None:
+        write_report_rows(sink, filtered_transactions)
+        return
 
     print(
         f"\n Отчёт 3: Затраты в интервале {start_time}–{end_time} "
@@ -168,3 +146,275 @@ def generate_expense_report_in_time_interval(transactions, start_time, end_time)
             f"{transaction['amount']:>8.2f} | "
             f"{transaction['counterparty']}"
         )
+
+
+def stream_income_report(reversed_transactions, number_of_days, sink):
+    """
+    Потоковый отчёт 1 по бюджету, прочитанному с конца.
+    reversed_transactions — транзакции в обратном хронологическом порядке.
+    Строки одной даты накапливаются, сортируются по сумме и выгружаются,
+    как только встречается более ранняя дата; чтение прекращается на первой
+    дате раньше начала периода или по достижении предела строк приёмника.
+    Записи с невалидной датой (в файле они стоят в конце) выгружаются последними.
+    Возвращает количество выгруженных строк.
+    """
+    rows_before = sink['rows_written']
+    today = None
+    start_date = None
+    current_date = None
+    current_group = []
+    invalid_date_rows = []
+
+    for transaction in reversed_transactions:
+        date_val = transaction.get('date')
+        is_income = transaction.get('direction') == 'приход'
+        if not isinstance(date_val, str) or validate_and_parse_date(date_val) is None:
+            if is_income and isinstance(date_val, str):
+                invalid_date_rows.append(transaction)
+            continue
+
+        if today is None:
+            today = date_val
+            start_date = subtract_days_from_date(today, number_of_days)
+        if date_val < start_date:
+            break
+        if current_date is not None and date_val > current_date:
+            print("  Предупреждение: бюджет не упорядочен по дате, отчёт может быть неполным.",
+                  file=sys.stderr)
+            break
+
+        if date_val != current_date:
+            write_report_rows(sink, sort_query_result(current_group, 'date_desc_amount_desc'))
+            if sink_is_full(sink):
+                return sink['rows_written'] - rows_before
+            current_date = date_val
+            current_group = []
+        if is_income:
+            current_group.append(transaction)
+
+    write_report_rows(sink, sort_query_result(current_group, 'date_desc_amount_desc'))
+
+    if today is None:
+        print("  Не удалось определить текущую дату: нет валидных записей.", file=sys.stderr)
+        return sink['rows_written'] - rows_before
+    invalid_date_rows = [
+        transaction
+        for transaction in invalid_date_rows
+        if transaction['date'] >= start_date
+    ]
+    write_report_rows(sink, sort_query_result(invalid_date_rows, 'date_desc_amount_desc'))
+    return sink['rows_written'] - rows_before
+
+
+def stream_category_report(reversed_transactions, category_name, sink):
+    """
+    Потоковый отчёт 2 по бюджету, прочитанному с конца.
+    Строки одной даты накапливаются, сортируются по контрагенту и сумме и
+    выгружаются, как только встречается более ранняя дата, поэтому первые
+    строки появляются до конца чтения. Записи с невалидной датой выгружаются
+    последними. Возвращает количество выгруженных строк.
+    """
+    filter_spec = category_expense_query(category_name)['filter']
+    sort_name = 'date_desc_counterparty_amount_desc'
+    rows_before = sink['rows_written']
+    current_date = None
+    current_group = []
+    invalid_date_rows = []
+
+    for transaction in reversed_transactions:
+        if not transaction_matches(filter_spec, transaction):
+            continue
+        date_val = transaction['date']
+        if validate_and_parse_date(date_val) is None:
+            invalid_date_rows.append(transaction)
+            continue
+        if current_date is not None and date_val > current_date:
+            print("  Предупреждение: бюджет не упорядочен по дате, отчёт может быть неполным.",
+                  file=sys.stderr)
+            break
+
+        if date_val != current_date:
+            write_report_rows(sink, sort_query_result(current_group, sort_name))
+            if sink_is_full(sink):
+                return sink['rows_written'] - rows_before
+            current_date = date_val
+            current_group = []
+        current_group.append(transaction)
+
+    write_report_rows(sink, sort_query_result(current_group, sort_name))
+    write_report_rows(sink, sort_query_result(invalid_date_rows, sort_name))
+    return sink['rows_written'] - rows_before
+
+
+def income_query(start_date):
+    """Запрос для отчёта 1: поступления начиная с start_date."""
+    return make_query(
+        sort='date_desc_amount_desc',
+        direction='приход',
+        date_from=start_date,
+    )
+
+
+def category_expense_query(category_name):
+    """Запрос для отчёта 2: затраты по категории."""
+    return make_query(
+        sort='date_desc_counterparty_amount_desc',
+        direction='расход',
+        category=category_name,
+    )
+
+
+def interval_expense_query(start_time, end_time):
+    """Запрос для отчёта 3: затраты в интервале времени."""
+    return make_query(
+        sort='amount_desc_counterparty',
+        direction='расход',
+        time_from=start_time,
+        time_to=end_time,
+    )
+
+
+# Описание отчёта (report spec) — словарь с ключом 'report' и параметрами:
+#   {'report': 'income', 'days': N}
+#   {'report': 'category', 'category': 'питание'}
+#   {'report': 'interval', 'start_time': 'ЧЧ:ММ', 'end_time': 'ЧЧ:ММ'}
+REPORT_TYPES = ('income', 'category', 'interval')
+# Отчёты, упорядоченные прежде всего по дате, можно выгружать по мере чтения
+STREAMING_REPORT_TYPES = ('income', 'category')
+
+
+def check_report_spec(report_spec):
+    """
+    Проверяет параметры описания отчёта.
+    Вызывает ValueError с описанием ошибки, если отчёт построить нельзя.
+    """
+    report_type = report_spec.get('report')
+    if report_type == 'income':
+        number_of_days = report_spec.get('days')
+        if not isinstance(number_of_days, int) or number_of_days < 0:
+            raise ValueError("для отчёта income нужно целое неотрицательное число дней")
+    elif report_type == 'category':
+        category = report_spec.get('category')
+        if not isinstance(category, str) or not category:
+            raise ValueError("для отчёта category нужна непустая категория")
+    elif report_type == 'interval':
+        for key in ('start_time', 'end_time'):
+            time_str = report_spec.get(key)
+            if not isinstance(time_str, str) or validate_and_parse_time(time_str) is None:
+                raise ValueError(
+                    "для отчёта interval нужны начало и конец интервала в формате ЧЧ:ММ"
+                )
+    else:
+        raise ValueError(f"Неизвестный тип отчёта: {report_type}")
+
+
+def build_report_query(report_spec, transactions):
+    """
+    Строит запрос по описанию отчёта.
+    Для отчёта 'income' начало периода отсчитывается от последней даты в transactions.
+    Возвращает запрос или None, если в transactions нет ни одной валидной даты
+    (отчёт 'income' пуст). Неверное описание вызывает ValueError.
+    """
+    check_report_spec(report_spec)
+    report_type = report_spec['report']
+    if report_type == 'income':
+        number_of_days = report_spec['days']
+        today = get_valid_latest_date(transactions)
+        if today is None:
+            return None
+        start_date = subtract_days_from_date(today, number_of_days)
+        if start_date is None:
+            return None
+        return income_query(start_date)
+    if report_type == 'category':
+        return category_expense_query(report_spec['category'])
+    return interval_expense_query(report_spec['start_time'], report_spec['end_time'])
+
+
+def run_report_spec(report_spec, path=None):
+    """
+    Загружает бюджет из path (по умолчанию BUDGET_DATA_FILE) и возвращает
+    строки отчёта в порядке сортировки отчёта или None, если бюджет не загружен.
+    Неверное описание отчёта вызывает ValueError ещё до загрузки.
+    """
+    check_report_spec(report_spec)
+    symbol_table = {}
+    transactions = load_budget_transactions(
+        path=path, create_if_missing=False, symbol_table=symbol_table
+    )
+    if transactions is None:
+        return None
+    query = build_report_query(report_spec, transactions)
+    if query is None:
+        return []
+    return run_query(transactions, query, symbol_table)
+
+
+def run_report_queries(transactions, report_specs, symbol_table=None):
+    """
+    Строит несколько отчётов за один проход по transactions
+    (см. query.run_queries), например пакет отчётов по многим категориям.
+    Возвращает список строк каждого отчёта в порядке report_specs.
+    Неверное описание отчёта вызывает ValueError.
+    """
+    queries = []
+    query_indexes = []
+    for report_spec in report_specs:
+        query = build_report_query(report_spec, transactions)
+        if query is None:
+            query_indexes.append(None)
+        else:
+            query_indexes.append(len(queries))
+            queries.append(query)
+
+    results = run_queries(transactions, queries, symbol_table)
+    return [[] if index is None else results[index] for index in query_indexes]
+
+
+def run_report_pack(report_specs, path=None):
+    """
+    Загружает бюджет из path один раз и строит по нему все отчёты report_specs
+    за один проход. Возвращает список строк каждого отчёта в порядке
+    report_specs или None, если бюджет не загружен.
+    """
+    for report_spec in report_specs:
+        check_report_spec(report_spec)
+    symbol_table = {}
+    transactions = load_budget_transactions(
+        path=path, create_if_missing=False, symbol_table=symbol_table
+    )
+    if transactions is None:
+        return None
+    return run_report_queries(transactions, report_specs, symbol_table)
+
+
+def category_report_specs(category_names):
+    """Описания отчётов 2 для каждой категории из category_names."""
+    return [{'report': 'category', 'category': name} for name in category_names]
+
+
+def stream_ledger_report(report_spec, sink, path=None):
+    """
+    Строит отчёт 'income' или 'category' прямо по файлу бюджета path
+    (по умолчанию BUDGET_DATA_FILE), читая его с конца блоками
+    (см. data_loader.iter_budget_transactions_reversed). Бюджет не загружается
+    целиком: строки выгружаются в sink по датам, начиная с последней.
+    Возвращает количество выгруженных строк или None, если файл не прочитан.
+    """
+    check_report_spec(report_spec)
+    report_type = report_spec['report']
+    if report_type not in STREAMING_REPORT_TYPES:
+        raise ValueError(f"Отчёт {report_type} нельзя построить потоково")
+    if path is None:
+        path = BUDGET_DATA_FILE
+
+    reversed_transactions = iter_budget_transactions_reversed({}, path)
+    try:
+        if report_type == 'income':
+            return stream_income_report(reversed_transactions, report_spec['days'], sink)
+        return stream_category_report(reversed_transactions, report_spec['category'], sink)
+    except FileNotFoundError:
+        print(f" Файл '{path}' не найден.", file=sys.stderr)
+    except (OSError, UnicodeDecodeError) as error:
+        print(f" Ошибка при чтении файла: {error}", file=sys.stderr)
+    return None
@@ -64,6 +64,20 @@ def validate_and_parse_date(date_str):
     return (year, month, day)
 
 
+def validate_and_parse_time(time_str):
+    """
+    Валидирует и парсит время в формате 'ЧЧ:ММ'.
+    Возвращает кортеж (hours, minutes) или None при ошибке.
+    """
+    try:
+        hours, minutes = map(int, time_str.split(':'))
+    except (ValueError, AttributeError):
+        return None
+    if not (0 <= hours <= 23 and 0 <= minutes <= 59):
+        return None
+    return (hours, minutes)
+
+
 def tuple_to_date(year, month, day):
     """Преобразует (год, месяц, день) в строку 'ГГГГ-ММ-ДД'."""
     return f"{year:04d}-{month:02d}-{day:02d}"
@@ -107,3 +121,27 @@ def get_valid_latest_date(transactions):
     if not valid_dates:
         return None
     return max(valid_dates)
+
+
+def chronological_sort_key(date_str, time_str):
+    """
+    Возвращает ключ (год, месяц, день, час, минута) для хронологической сортировки.
+    Невалидная дата даёт (9999, 99, 99), невалидное время — (99, 99),
+    поэтому такие записи оказываются в конце.
+    """
+    parsed = validate_and_parse_date(date_str)
+    if parsed:
+        year, month, day = parsed
+    else:
+        year, month, day = 9999, 99, 99
+
+    try:
+        time_parts = time_str.split(':')
+        hour = int(time_parts[0])
+        minute = int(time_parts[1])
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            raise ValueError
+    except (ValueError, IndexError, AttributeError):
+        hour, minute = 99, 99
+
+    return (year, month, day, hour, minute)